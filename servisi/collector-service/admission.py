@@ -0,0 +1,139 @@
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """Token bucket - rate tokena po sekundi, najviše burst tokena"""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        """Uzmi token; vraća 0 ili broj sekundi do sljedećeg tokena"""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class RateLimiter:
+    """Ograničenje po senzoru i globalno, O(1) po provjeri.
+
+    Bucketi senzora drže se u LRU poretku; najdulje neaktivni se
+    izbacuju kad ih je više od max_buckets (pun bucket je ionako
+    isto što i novi). rate 0 isključuje pripadno ograničenje.
+    """
+
+    def __init__(
+        self,
+        sensor_rate: float,
+        sensor_burst: float,
+        global_rate: float,
+        global_burst: float,
+        max_buckets: int = 100000
+    ):
+        self.sensor_rate = sensor_rate
+        self.sensor_burst = max(sensor_burst, 1)
+        self.global_rate = global_rate
+        self.global_burst = max(global_burst, 1)
+        self.max_buckets = max_buckets
+        self.rejected_sensor = 0
+        self.rejected_global = 0
+        self._global = TokenBucket(self.global_burst, time.monotonic())
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, sensor_id: str) -> float:
+        """0 ako je zahtjev dozvoljen, inače preporučeni Retry-After u sekundama"""
+        now = time.monotonic()
+        bucket = None
+
+        if self.sensor_rate > 0:
+            bucket = self._buckets.get(sensor_id)
+            if bucket is None:
+                bucket = self._buckets[sensor_id] = TokenBucket(self.sensor_burst, now)
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(sensor_id)
+            wait = bucket.take(self.sensor_rate, self.sensor_burst, now)
+            if wait:
+                self.rejected_sensor += 1
+                return wait
+
+        if self.global_rate > 0:
+            wait = self._global.take(self.global_rate, self.global_burst, now)
+            if wait:
+                # Token senzora se vraća jer zahtjev ipak nije prošao
+                if bucket is not None:
+                    bucket.tokens += 1
+                self.rejected_global += 1
+                return wait
+
+        return 0.0
+
+    def get_stats(self) -> Dict:
+        return {
+            "rejected_sensor": self.rejected_sensor,
+            "rejected_global": self.rejected_global,
+            "tracked_sensors": len(self._buckets)
+        }
+
+
+class LoadShedder:
+    """Rano odbijanje zahtjeva kad storage kasni ili je previše zahtjeva u tijeku.
+
+    Latencija storagea prati se kao EWMA. Iznad praga zahtjevi se odbijaju
+    s vjerojatnošću koja raste s prekoračenjem (najviše max_shed_ratio), pa
+    dio zahtjeva i dalje prolazi i mjeri oporavak storagea.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        latency_threshold: float,
+        alpha: float = 0.2,
+        max_shed_ratio: float = 0.9
+    ):
+        self.max_in_flight = max_in_flight
+        self.latency_threshold = latency_threshold
+        self.alpha = alpha
+        self.max_shed_ratio = max_shed_ratio
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.shed = 0
+
+    def should_shed(self) -> bool:
+        if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+            self.shed += 1
+            return True
+        if self.latency_threshold > 0 and self.latency is not None and self.latency > self.latency_threshold:
+            overload = (self.latency - self.latency_threshold) / self.latency_threshold
+            if random.random() < min(overload, self.max_shed_ratio):
+                self.shed += 1
+                return True
+        return False
+
+    def start(self):
+        self.in_flight += 1
+
+    def finish(self, latency: Optional[float] = None):
+        self.in_flight -= 1
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+
+    def get_stats(self) -> Dict:
+        return {
+            "shed": self.shed,
+            "in_flight": self.in_flight,
+            "storage_latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None
+        }
@@ -0,0 +1,121 @@
+"""Benchmark CPU troška validacije jednog očitanja (collector + storage).
+
+"Prije" ponavlja stari put: SensorData s v1 @validator, DataValidator s
+vlastitim rasponima, novi dict s ISO timestampom, json.dumps pa ponovno
+parsiranje u storage SensorDataCreate s datetime poljem.
+"Poslije" je novi put: jedna SensorReading shema, model_validate_json,
+model_dump_json prema storageu s epoch timestampom.
+
+Pokretanje iz direktorija servisa:
+    PYTHONPATH=.. python bench_validation.py [broj_očitanja]
+"""
+import json
+import sys
+import time
+import warnings
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from shared.readings import SensorReading, is_plausible, is_fresh
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    from pydantic import validator
+
+    class LegacySensorData(BaseModel):
+        sensor_id: str = Field(..., min_length=1, max_length=50)
+        temperature: float = Field(..., ge=-50, le=100)
+        aqi: float = Field(..., ge=0, le=500)
+        timestamp: Optional[float] = None
+
+        @validator('temperature')
+        def validate_temperature(cls, v):
+            if v < -40 or v > 60:
+                raise ValueError('Temperatura izvan realnog raspona za HR')
+            return v
+
+
+class LegacySensorDataCreate(BaseModel):
+    sensor_id: str
+    temperature: float
+    aqi: float
+    timestamp: Optional[datetime] = None
+
+
+def legacy_consistency(data: LegacySensorData) -> bool:
+    if data.temperature == 0 and data.aqi == 0:
+        return False
+    if data.timestamp:
+        current_time = datetime.utcnow().timestamp()
+        if data.timestamp > current_time:
+            return False
+        if current_time - data.timestamp > 86400:
+            return False
+    if data.temperature < -20 or data.temperature > 50:
+        return False
+    if data.aqi < 0 or data.aqi > 300:
+        return False
+    return True
+
+
+def legacy_path(body: bytes):
+    # Collector: FastAPI json.loads + validacija dict-a
+    data = LegacySensorData(**json.loads(body))
+    legacy_consistency(data)
+    storage_data = {
+        "sensor_id": data.sensor_id,
+        "temperature": data.temperature,
+        "aqi": data.aqi,
+        "timestamp": datetime.fromtimestamp(data.timestamp).isoformat() if data.timestamp else None
+    }
+    payload = json.dumps(storage_data)
+    # Storage: json.loads + ponovna validacija i parsiranje ISO datuma
+    return LegacySensorDataCreate(**json.loads(payload))
+
+
+def new_path(body: bytes):
+    # Collector: parsiranje i validacija u jednom prolazu
+    data = SensorReading.model_validate_json(body)
+    is_plausible(data) and is_fresh(data.timestamp, time.time())
+    payload = data.model_dump_json()
+    # Storage: ista shema, epoch se pretvara u datetime jednom
+    stored = SensorReading.model_validate_json(payload)
+    return datetime.utcfromtimestamp(stored.timestamp)
+
+
+def measure(fn, bodies) -> float:
+    began = time.process_time()
+    for body in bodies:
+        fn(body)
+    return time.process_time() - began
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    now = time.time()
+    bodies = [
+        json.dumps({
+            "sensor_id": f"SIM-{i % 50:03d}",
+            "temperature": 10 + (i % 200) / 10,
+            "aqi": 20 + (i % 100),
+            "timestamp": now - i % 3600
+        }).encode()
+        for i in range(count)
+    ]
+
+    # Zagrijavanje
+    measure(legacy_path, bodies[:1000])
+    measure(new_path, bodies[:1000])
+
+    before = measure(legacy_path, bodies)
+    after = measure(new_path, bodies)
+    print(f"Readings: {count}")
+    print(f"Before:   {before / count * 1e6:.2f} us/reading CPU")
+    print(f"After:    {after / count * 1e6:.2f} us/reading CPU")
+    print(f"Speedup:  {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,114 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 from typing import Optional
 import aiohttp
+import asyncio
+import math
+import time
 import os
 
-from models import SensorData, IngestResponse, HealthResponse
-from services import StorageClient, DataValidator
+from models import SensorReading, IngestResponse, HealthResponse
+from services import StorageClient, DataValidator, ReadingPublisher, RecentKeyWindow
+from admission import RateLimiter, LoadShedder
+from shared.readings import TEMPERATURE_MIN, TEMPERATURE_MAX, AQI_MIN, AQI_MAX
+from shared.fastjson import json_serialize, response_class
+from shared import tracing
+from shared.readiness import Readiness, wait_for_service
 
 app = FastAPI(
     title="Collector Service",
     description="Async servis za prikupljanje podataka sa senzora",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=response_class()
 )
+tracing.setup(app, "collector")
 
 # Konfiguracija
 STORAGE_SERVICE_URL = os.getenv("STORAGE_SERVICE_URL", "http://localhost:8001")
+PROCESSING_SERVICE_URL = os.getenv("PROCESSING_SERVICE_URL", "")
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "10000"))
+DEDUPE_WINDOW_SIZE = int(os.getenv("DEDUPE_WINDOW_SIZE", "100000"))
+DEDUPE_TTL = float(os.getenv("DEDUPE_TTL", "3600"))
+RATE_LIMIT_PER_SENSOR = float(os.getenv("RATE_LIMIT_PER_SENSOR", "5"))
+RATE_LIMIT_SENSOR_BURST = float(os.getenv("RATE_LIMIT_SENSOR_BURST", "10"))
+RATE_LIMIT_GLOBAL = float(os.getenv("RATE_LIMIT_GLOBAL", "1000"))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_BURST", "2000"))
+SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", "500"))
+SHED_LATENCY_MS = float(os.getenv("SHED_LATENCY_MS", "1000"))
+SHED_RETRY_AFTER = int(os.getenv("SHED_RETRY_AFTER", "1"))
+STORAGE_WAIT_TIMEOUT = float(os.getenv("STORAGE_WAIT_TIMEOUT", "0"))
+WORKERS = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
 
 # Globalne varijable
 client_session: Optional[aiohttp.ClientSession] = None
 storage_client: Optional[StorageClient] = None
+reading_publisher: Optional[ReadingPublisher] = None
+readiness_task: Optional[asyncio.Task] = None
+readiness = Readiness("collector")
+recent_keys = RecentKeyWindow(capacity=DEDUPE_WINDOW_SIZE, ttl=DEDUPE_TTL)
+storage_duplicates = 0
+# Limiti su zadani za cijeli servis; svaki worker drži svoj dio
+rate_limiter = RateLimiter(
+    sensor_rate=RATE_LIMIT_PER_SENSOR / WORKERS,
+    sensor_burst=RATE_LIMIT_SENSOR_BURST / WORKERS,
+    global_rate=RATE_LIMIT_GLOBAL / WORKERS,
+    global_burst=RATE_LIMIT_GLOBAL_BURST / WORKERS
+)
+load_shedder = LoadShedder(
+    max_in_flight=SHED_MAX_IN_FLIGHT,
+    latency_threshold=SHED_LATENCY_MS / 1000
+)
 
 @app.on_event("startup")
 async def startup():
-    global client_session, storage_client
+    global client_session, storage_client, reading_publisher, readiness_task
     
-    client_session = aiohttp.ClientSession()
+    client_session = aiohttp.ClientSession(json_serialize=json_serialize)
     storage_client = StorageClient(STORAGE_SERVICE_URL, client_session)
+    readiness_task = asyncio.create_task(wait_for_storage())
+    
+    # Event stream prema processing servisu (opcionalno)
+    if PROCESSING_SERVICE_URL:
+        reading_publisher = ReadingPublisher(PROCESSING_SERVICE_URL, client_session, max_queue=EVENT_QUEUE_SIZE)
+        reading_publisher.start()
     
     print(f"Collector Service started (port 8002)")
     print(f"Storage URL: {STORAGE_SERVICE_URL}")
+    print(f"Processing URL: {PROCESSING_SERVICE_URL or 'disabled'}")
+
+async def wait_for_storage():
+    """Servis je spreman tek kad je storage spreman (čeka se s backoffom)"""
+    # Ovaj zahtjev ujedno otvara keep-alive konekciju prema storageu
+    url = f"{STORAGE_SERVICE_URL}/ready"
+    if not await wait_for_service(client_session, url, "storage", timeout=STORAGE_WAIT_TIMEOUT or None):
+        # Timeout služi samo za dojavu - čekanje se nastavlja, inače collector nikad ne bi postao spreman
+        readiness.checks["storage"] = False
+        print(f"Storage nije spreman nakon {STORAGE_WAIT_TIMEOUT}s, nastavljam čekati")
+        await wait_for_service(client_session, url, "storage")
+    readiness.checks["storage"] = True
+    readiness.mark_ready()
 
 @app.on_event("shutdown")
 async def shutdown():
     global client_session
     
+    if readiness_task:
+        readiness_task.cancel()
+    
+    if reading_publisher:
+        await reading_publisher.stop()
+    
     if client_session:
         await client_session.close()
         print(" Collector Service stopped")
 
+@app.get("/ready")
+async def ready():
+    """Readiness - storage je dostupan i servis prima promet"""
+    return JSONResponse(readiness.to_dict(), status_code=200 if readiness.ready else 503)
+
 @app.get("/health", response_model=HealthResponse)
 async def health():
     """Health check endpoint"""
@@ -52,17 +124,120 @@ async def health():
         
     )
 
-@app.post("/ingest", response_model=IngestResponse)
-async def ingest(data: SensorData):
+@app.post(
+    "/ingest",
+    response_model=IngestResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": SensorReading.model_json_schema()}}
+        }
+    }
+)
+async def ingest(request: Request):
     """Glavni endpoint za primanje podataka sa senzora"""
+    global storage_duplicates
+    
+    if not readiness.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Collector još nije spreman (čeka storage)",
+            headers={"Retry-After": str(SHED_RETRY_AFTER)}
+        )
+    
+    body = await request.body()
+    
+    # JSON se parsira i validira u jednom prolazu (pydantic-core)
+    try:
+        with tracing.span("validate"):
+            data = SensorReading.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
     
     # Dodatna validacija
-    if not DataValidator.validate_data_consistency(data):
+    with tracing.span("validate_consistency"):
+        consistent = DataValidator.validate_data_consistency(data)
+    if not consistent:
         raise HTTPException(
             status_code=400,
             detail="Podaci nisu konzistentni ili su izvan dozvoljenog raspona"
         )
     
+    # Duplikat iz nedavnog prozora odbacuje se prije rate limita i bez poziva storagea,
+    # pa ponovljeni pokušaji ne troše tokene senzora
+    key = (data.sensor_id, data.timestamp) if data.timestamp is not None else None
+    if key and not recent_keys.reserve(key):
+        return IngestResponse(
+            status="duplicate",
+            sensor=data.sensor_id,
+            message="Očitanje je već primljeno"
+        )
+    
+    # Load shedding - bolje odmah odbiti nego čekati timeout; token se uzima tek za primljen zahtjev
+    if load_shedder.should_shed():
+        if key:
+            recent_keys.release(key)
+        raise HTTPException(
+            status_code=503,
+            detail="Collector je preopterećen, pokušajte kasnije",
+            headers={"Retry-After": str(SHED_RETRY_AFTER)}
+        )
+    
+    # Rate limit po senzoru i globalno
+    retry_after = rate_limiter.check(data.sensor_id)
+    if retry_after:
+        if key:
+            recent_keys.release(key)
+        raise HTTPException(
+            status_code=429,
+            detail="Previše zahtjeva, pokušajte kasnije",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+    
+    stored = False
+    load_shedder.start()
+    started = time.perf_counter()
+    try:
+        result = await check_and_store(data)
+        stored = True
+    finally:
+        load_shedder.finish(time.perf_counter() - started)
+        if key:
+            if stored:
+                recent_keys.commit(key)
+            else:
+                recent_keys.release(key)
+    
+    if result.get("duplicate"):
+        storage_duplicates += 1
+        return IngestResponse(
+            status="duplicate",
+            sensor=data.sensor_id,
+            data_id=result.get("id"),
+            message="Očitanje je već spremljeno"
+        )
+    
+    # Objavi spremljeno očitanje processing servisu
+    if reading_publisher:
+        reading_publisher.publish({
+            "sensor_id": data.sensor_id,
+            "temperature": data.temperature,
+            "aqi": data.aqi,
+            "timestamp": data.timestamp if data.timestamp is not None else result.get("timestamp")
+        })
+    
+    return IngestResponse(
+        status="received and stored",
+        sensor=data.sensor_id,
+        data_id=result.get("id"),
+        message="Podaci uspješno spremljeni"
+    )
+
+async def check_and_store(data: SensorReading) -> dict:
+    """Provjeri senzor i spremi očitanje u storage"""
+    
     # Provjeri postoji li senzor
     try:
         sensor_exists = await storage_client.check_sensor_exists(data.sensor_id)
@@ -79,15 +254,7 @@ async def ingest(data: SensorData):
     
     # Spremi podatke
     try:
-        result = await storage_client.store_data(data)
-        
-        return IngestResponse(
-            status="received and stored",
-            sensor=data.sensor_id,
-            data_id=result.get("id"),
-            message="Podaci uspješno spremljeni"
-        )
-        
+        return await storage_client.store_data(data)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -118,14 +285,24 @@ async def get_stats():
         "storage_connected": await storage_client.check_health() if storage_client else False,
         "configuration": {
             "storage_url": STORAGE_SERVICE_URL,
-            "temperature_range": [-50, 100],
-            "aqi_range": [0, 500],
+            "temperature_range": [TEMPERATURE_MIN, TEMPERATURE_MAX],
+            "aqi_range": [AQI_MIN, AQI_MAX],
             "max_data_age": "24 hours"
+        },
+        "events": reading_publisher.get_stats() if reading_publisher else None,
+        "dedupe": {
+            **recent_keys.get_stats(),
+            "storage_duplicates": storage_duplicates
+        },
+        "admission": {
+            **rate_limiter.get_stats(),
+            **load_shedder.get_stats()
         }
     }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8002, reload=True)
+    # Broj workera iz WEB_CONCURRENCY; svaki worker ima svoju aiohttp sesiju i limite
+    uvicorn.run("main:app", host="0.0.0.0", port=8002, workers=WORKERS)
 
 
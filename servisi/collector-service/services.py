@@ -1,7 +1,12 @@
+import asyncio
 import aiohttp
-from typing import Optional, Dict
-from datetime import datetime
-from models import SensorData
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple, Set
+from models import SensorReading
+from shared.readings import is_plausible, is_fresh
+from shared.fastjson import loads
+from shared import tracing
 
 class StorageClient:
     """Klijent za komunikaciju sa Storage servisom"""
@@ -14,28 +19,30 @@ class StorageClient:
         """Provjeri postoji li senzor u storage servisu"""
         try:
             url = f"{self.base_url}/sensors/{sensor_id}"
-            async with self.session.get(url) as response:
-                return response.status == 200
+            with tracing.span("check_sensor_exists", kind="CLIENT", sensor_id=sensor_id):
+                async with self.session.get(url, headers=tracing.inject()) as response:
+                    return response.status == 200
         except aiohttp.ClientError as e:
             print(f"Error checking sensor {sensor_id}: {e}")
             raise
     
-    async def store_data(self, data: SensorData) -> Dict:
-        """Pošalji podatke na storage servis"""
-        storage_data = {
-            "sensor_id": data.sensor_id,
-            "temperature": data.temperature,
-            "aqi": data.aqi,
-            "timestamp": datetime.fromtimestamp(data.timestamp).isoformat() if data.timestamp else None
-        }
-        
+    async def store_data(self, data: SensorReading) -> Dict:
+        """Pošalji podatke na storage servis (ista shema, epoch timestamp)"""
         try:
             url = f"{self.base_url}/data"
-            async with self.session.post(url, json=storage_data) as response:
-                if response.status not in [200, 201]:
-                    text = await response.text()
-                    raise Exception(f"Storage returned {response.status}: {text}")
-                return await response.json()
+            with tracing.span("store_data", kind="CLIENT", sensor_id=data.sensor_id):
+                async with self.session.post(
+                    url,
+                    data=data.model_dump_json(),
+                    headers=tracing.inject({"Content-Type": "application/json"})
+                ) as response:
+                    if response.status not in [200, 201]:
+                        text = await response.text()
+                        raise Exception(f"Storage returned {response.status}: {text}")
+                    result = await response.json(loads=loads)
+                    # Storage vraća postojeći zapis ako je očitanje već spremljeno
+                    result["duplicate"] = response.headers.get("X-Duplicate") == "1"
+                    return result
         except aiohttp.ClientError as e:
             print(f"Error storing data: {e}")
             raise
@@ -52,32 +59,141 @@ class StorageClient:
         except:
             return False
 
+class RecentKeyWindow:
+    """Prozor nedavno primljenih (sensor_id, timestamp) ključeva.
+
+    Duplikat se odbacuje prije ijednog poziva storagea. Ključ se prvo
+    rezervira, a pamti tek nakon uspješnog spremanja, pa neuspjeli pokušaj
+    ne blokira ponovno slanje istog očitanja.
+    """
+    
+    def __init__(self, capacity: int = 100000, ttl: float = 3600):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._keys: "OrderedDict[Tuple[str, float], float]" = OrderedDict()
+        self._pending: Set[Tuple[str, float]] = set()
+    
+    def reserve(self, key: Tuple[str, float]) -> bool:
+        """Rezerviraj ključ; False znači da je očitanje duplikat"""
+        self._expire(time.monotonic())
+        if key in self._keys or key in self._pending:
+            self.hits += 1
+            return False
+        self.misses += 1
+        self._pending.add(key)
+        return True
+    
+    def commit(self, key: Tuple[str, float]):
+        """Očitanje je spremljeno - zapamti ključ"""
+        self._pending.discard(key)
+        self._keys[key] = time.monotonic()
+        while len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+    
+    def release(self, key: Tuple[str, float]):
+        """Spremanje nije uspjelo - dozvoli ponovni pokušaj"""
+        self._pending.discard(key)
+    
+    def _expire(self, now: float):
+        while self._keys:
+            key, seen_at = next(iter(self._keys.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self._keys[key]
+    
+    def get_stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._keys),
+            "capacity": self.capacity
+        }
+
+class ReadingPublisher:
+    """Objavljivanje prihvaćenih očitanja prema processing servisu.
+
+    Očitanja idu u ograničeni red, a pozadinski task ih šalje u batchevima
+    na POST /events/readings. Ingest nikad ne čeka processing - ako je red
+    pun, očitanje se odbacuje (processing ga kasnije dohvati iz storagea).
+    """
+    
+    def __init__(
+        self,
+        base_url: str,
+        session: aiohttp.ClientSession,
+        max_queue: int = 10000,
+        batch_size: int = 500
+    ):
+        self.base_url = base_url
+        self.session = session
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+    
+    def publish(self, reading: Dict) -> bool:
+        """Stavi očitanje u red bez čekanja"""
+        try:
+            self.queue.put_nowait(reading)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+    
+    async def _run(self):
+        while True:
+            # Batch = sve što se nakupilo dok je prethodni slanje trajalo
+            batch: List[Dict] = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self._send(batch)
+    
+    async def _send(self, batch: List[Dict]):
+        try:
+            async with self.session.post(
+                f"{self.base_url}/events/readings",
+                json=batch,
+                timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                if response.status == 200:
+                    self.published += len(batch)
+                    return
+                print(f"Processing returned {response.status} for events")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error publishing events: {e}")
+        self.failed += len(batch)
+    
+    def get_stats(self) -> Dict:
+        return {
+            "published": self.published,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "queued": self.queue.qsize()
+        }
+
 class DataValidator:
-    """Validator za dodatne provjere podataka"""
+    """Validator za provjere koje shema ne može izraziti.
+
+    Rasponi vrijednosti provjeravaju se samo jednom, u SensorReading shemi.
+    """
     
     @staticmethod
-    def validate_data_consistency(data: SensorData) -> bool:
+    def validate_data_consistency(data: SensorReading) -> bool:
         """Provjeri konzistentnost podataka"""
-        # Provjeri da li su temperatura i AQI u logičnoj korelaciji
-        # Npr. visoka temperatura ljeti može biti povezana s višim AQI
-        if data.temperature == 0 and data.aqi == 0:
+        if not is_plausible(data):
             # Možda je greška u očitanju
             return False
         
-        # Provjeri timestamp
-        if data.timestamp:
-            current_time = datetime.utcnow().timestamp()
-            # Podatak ne smije biti iz budućnosti
-            if data.timestamp > current_time:
-                return False
-            # Podatak ne smije biti stariji od 24h
-            if current_time - data.timestamp > 86400:
-                return False
-        
-        if data.temperature < -20 or data.temperature > 50:
-            return False
-
-        if data.aqi < 0 or data.aqi > 300:
-            return False
-
-        return True
\ No newline at end of file
+        # Podatak ne smije biti iz budućnosti ni stariji od 24h
+        return is_fresh(data.timestamp, time.time())
@@ -0,0 +1,165 @@
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+import math
+
+METRICS = ("temperature", "aqi")
+
+
+class AnomalyEvent:
+    """Jedna detektirana anomalija"""
+
+    __slots__ = ("sensor_id", "metric", "kind", "value", "score", "timestamp")
+
+    def __init__(self, sensor_id: str, metric: str, kind: str, value: float, score: float, timestamp: float):
+        self.sensor_id = sensor_id
+        self.metric = metric
+        self.kind = kind
+        self.value = value
+        self.score = score
+        self.timestamp = timestamp
+
+    def to_dict(self) -> Dict:
+        return {
+            "sensor_id": self.sensor_id,
+            "metric": self.metric,
+            "kind": self.kind,
+            "value": self.value,
+            "score": round(self.score, 3),
+            "timestamp": datetime.utcfromtimestamp(self.timestamp),
+        }
+
+
+class _MetricState:
+    """EWMA/EWMVar i zadnja vrijednost jedne metrike - O(1) memorija"""
+
+    __slots__ = ("mean", "var", "count", "last_value", "last_ts", "repeats")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.last_value: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        self.repeats = 0
+
+
+class _SensorState:
+    __slots__ = ("metrics", "active", "total")
+
+    def __init__(self):
+        self.metrics = {metric: _MetricState() for metric in METRICS}
+        self.active: List[str] = []
+        self.total = 0
+
+
+class AnomalyDetector:
+    """Streaming detekcija anomalija po senzoru.
+
+    - z-score prema eksponencijalno ponderiranom prosjeku i varijanci
+    - zaglavljena vrijednost (ista vrijednost stuck_count puta zaredom)
+    - prebrza promjena (apsolutna promjena po minuti iznad limita)
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.1,
+        z_threshold: float = 4.0,
+        warmup: int = 20,
+        stuck_count: int = 10,
+        max_rate: Optional[Dict[str, float]] = None,
+        history: int = 1000
+    ):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.stuck_count = stuck_count
+        self.max_rate = max_rate or {"temperature": 5.0, "aqi": 100.0}
+        self.recent: Deque[AnomalyEvent] = deque(maxlen=history)
+        self._sensors: Dict[str, _SensorState] = {}
+
+    def observe(self, sensor_id: str, ts: float, temperature: float, aqi: float) -> List[AnomalyEvent]:
+        """Obradi očitanje i vrati nove anomalije"""
+        state = self._sensors.get(sensor_id)
+        if state is None:
+            state = self._sensors[sensor_id] = _SensorState()
+
+        events: List[AnomalyEvent] = []
+        active: List[str] = []
+        self._check(sensor_id, "temperature", state.metrics["temperature"], ts, temperature, events, active)
+        self._check(sensor_id, "aqi", state.metrics["aqi"], ts, aqi, events, active)
+
+        state.active = active
+        if events:
+            state.total += len(events)
+            self.recent.extend(events)
+        return events
+
+    def _check(
+        self,
+        sensor_id: str,
+        metric: str,
+        m: _MetricState,
+        ts: float,
+        value: float,
+        events: List[AnomalyEvent],
+        active: List[str]
+    ):
+        # Zaglavljena vrijednost - prijavljuje se jednom, ostaje aktivna dok traje
+        if value == m.last_value:
+            m.repeats += 1
+            if m.repeats >= self.stuck_count - 1:
+                active.append(f"{metric}:stuck")
+                if m.repeats == self.stuck_count - 1:
+                    events.append(AnomalyEvent(sensor_id, metric, "stuck", value, m.repeats + 1, ts))
+        else:
+            m.repeats = 0
+
+        # Brzina promjene po minuti; kraći razmaci računaju se kao minuta
+        # kako šum između bliskih očitanja ne bi izgledao kao skok
+        if m.last_ts is not None and ts > m.last_ts:
+            rate = abs(value - m.last_value) * 60 / max(ts - m.last_ts, 60)
+            if rate > self.max_rate[metric]:
+                active.append(f"{metric}:rate")
+                events.append(AnomalyEvent(sensor_id, metric, "rate", value, rate, ts))
+
+        # z-score prije ažuriranja, da spike ne ublaži sam sebe
+        if m.count >= self.warmup and m.var > 1e-9:
+            z = (value - m.mean) / math.sqrt(m.var)
+            if abs(z) > self.z_threshold:
+                active.append(f"{metric}:zscore")
+                events.append(AnomalyEvent(sensor_id, metric, "zscore", value, z, ts))
+
+        if m.count == 0:
+            m.mean = value
+        else:
+            diff = value - m.mean
+            increment = self.alpha * diff
+            m.mean += increment
+            m.var = (1 - self.alpha) * (m.var + diff * increment)
+        m.count += 1
+        m.last_value = value
+        m.last_ts = ts
+
+    def active(self, sensor_id: str) -> List[str]:
+        """Anomalije aktivne na zadnjem očitanju senzora"""
+        state = self._sensors.get(sensor_id)
+        return list(state.active) if state else []
+
+    def total(self, sensor_id: str) -> int:
+        state = self._sensors.get(sensor_id)
+        return state.total if state else 0
+
+    def forget(self, sensor_id: str):
+        """Zaboravi stanje senzora; već zabilježene anomalije ostaju u povijesti"""
+        self._sensors.pop(sensor_id, None)
+
+    def latest(self, sensor_id: Optional[str] = None, limit: int = 100) -> List[AnomalyEvent]:
+        """Najnovije anomalije, opcionalno samo za jedan senzor"""
+        result: List[AnomalyEvent] = []
+        for event in reversed(self.recent):
+            if sensor_id is None or event.sensor_id == sensor_id:
+                result.append(event)
+                if len(result) >= limit:
+                    break
+        return result
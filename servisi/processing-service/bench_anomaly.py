@@ -0,0 +1,53 @@
+"""Benchmark propusnosti detekcije anomalija.
+
+Pokretanje iz direktorija servisa:
+    python bench_anomaly.py [broj_očitanja] [broj_senzora]
+"""
+import random
+import sys
+import time
+
+from anomaly import AnomalyDetector
+
+TARGET_RATE = 10_000
+
+
+def generate(readings: int, sensors: int):
+    random.seed(42)
+    start = time.time() - readings * 5 / sensors
+    temps = [15.0] * sensors
+    aqis = [40.0] * sensors
+    data = []
+    for i in range(readings):
+        sensor = i % sensors
+        # Isti AR(1) oblik kao simulator, uz rijetke umjetne skokove
+        temps[sensor] = 0.8 * temps[sensor] + 0.2 * (15 + random.gauss(0, 1.5))
+        aqis[sensor] = 0.7 * aqis[sensor] + 0.3 * (40 + random.gauss(0, 5))
+        aqi = aqis[sensor] + (150 if random.random() < 0.001 else 0)
+        data.append((f"SIM-{sensor:05d}", start + (i // sensors) * 5, temps[sensor], aqi))
+    return data
+
+
+def main():
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    sensors = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    data = generate(readings, sensors)
+    
+    detector = AnomalyDetector()
+    observe = detector.observe
+    began = time.perf_counter()
+    found = 0
+    for sensor_id, ts, temp, aqi in data:
+        found += len(observe(sensor_id, ts, temp, aqi))
+    elapsed = time.perf_counter() - began
+    
+    rate = readings / elapsed
+    print(f"Readings:  {readings} ({sensors} sensors)")
+    print(f"Anomalies: {found}")
+    print(f"Time:      {elapsed:.3f}s")
+    print(f"Rate:      {rate:,.0f} readings/s ({elapsed / readings * 1e6:.2f} us/reading)")
+    print(f"Target:    {TARGET_RATE:,} readings/s -> {'OK' if rate >= TARGET_RATE else 'TOO SLOW'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import hashlib
+from typing import Callable, Dict, Optional
+
+
+def make_etag(body: bytes) -> str:
+    """Jaki ETag izveden iz sadržaja odgovora"""
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Provjeri pogađa li If-None-Match header trenutni ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class CachedResponse:
+    """Predserijalizirano JSON tijelo odgovora s ETagom"""
+
+    __slots__ = ("body", "etag", "version")
+
+    def __init__(self, body: bytes, version: int):
+        self.body = body
+        self.etag = make_etag(body)
+        self.version = version
+
+
+class ResponseCache:
+    """Verzionirani cache gotovih JSON odgovora.
+
+    Processing ciklus poništava cache i ponovno gradi odgovore jednom po
+    ciklusu, a čitanja između ciklusa samo vraćaju gotove bajtove.
+    Inkrementalne promjene poništavaju samo ključeve koje dotiču.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._entries: Dict[str, CachedResponse] = {}
+
+    def invalidate_all(self):
+        """Odbaci sve odgovore i podigni verziju"""
+        self.version += 1
+        self._entries = {}
+
+    def invalidate(self, *keys: str):
+        """Odbaci pojedine odgovore (inkrementalna promjena podataka)"""
+        self.version += 1
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        """Odbaci sve odgovore čiji ključ počinje s prefix (npr. stranice /stats)"""
+        self.version += 1
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return self._entries.get(key)
+
+    def get_or_build(self, key: str, builder: Callable[[], bytes]) -> CachedResponse:
+        """Vrati gotov odgovor ili ga izgradi i spremi za trenutnu verziju"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = CachedResponse(builder(), self.version)
+            self._entries[key] = entry
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
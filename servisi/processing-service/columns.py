@@ -0,0 +1,104 @@
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from shared.columnar import BYTES_PER_ROW
+from windows import to_epoch
+
+
+class ReadingColumns:
+    """Očitanja jednog senzora kao NumPy nizovi (epoch ts, temperatura, AQI).
+
+    Storage vraća najnovija očitanja prva; ovdje su poredana kronološki.
+    """
+
+    __slots__ = ("ts", "temperature", "aqi")
+
+    def __init__(self, ts: np.ndarray, temperature: np.ndarray, aqi: np.ndarray):
+        self.ts = ts
+        self.temperature = temperature
+        self.aqi = aqi
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @classmethod
+    def empty(cls) -> "ReadingColumns":
+        return cls(np.empty(0), np.empty(0), np.empty(0))
+
+    @classmethod
+    def from_binary(cls, body: bytes) -> "ReadingColumns":
+        """Binarni stupci iz storagea: ids (int64), temps, aqis, ts (float64), little-endian"""
+        if len(body) % BYTES_PER_ROW:
+            raise ValueError(f"Neispravna duljina stupčanog odgovora: {len(body)} B")
+        count = len(body) // BYTES_PER_ROW
+        columns = np.frombuffer(body, dtype="<f8").reshape(4, count)
+        # Redak 0 su id-evi (int64) i ne koristi se
+        return cls(
+            columns[3, ::-1].astype(np.float64),
+            columns[1, ::-1].astype(np.float64),
+            columns[2, ::-1].astype(np.float64)
+        )
+
+    @classmethod
+    def from_json(cls, payload: Dict) -> "ReadingColumns":
+        """JSON stupci iz storagea: {"ids", "temps", "aqis", "ts"}"""
+        return cls(
+            np.asarray(payload["ts"], dtype=np.float64)[::-1],
+            np.asarray(payload["temps"], dtype=np.float64)[::-1],
+            np.asarray(payload["aqis"], dtype=np.float64)[::-1]
+        )
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict]) -> "ReadingColumns":
+        """Redovi u starom formatu (najnoviji prvi); očitanja bez timestampa se preskaču"""
+        values = []
+        for row in reversed(rows):
+            ts = to_epoch(row.get("timestamp"))
+            if ts is not None:
+                values.append((ts, row["temperature"], row["aqi"]))
+        if not values:
+            return cls.empty()
+        ts, temperature, aqi = np.array(values, dtype=np.float64).T
+        return cls(ts, temperature, aqi)
+
+    def rows(self) -> Iterator[Tuple[float, float, float]]:
+        """(ts, temperatura, AQI) kronološki, kao Python floatovi"""
+        return zip(self.ts.tolist(), self.temperature.tolist(), self.aqi.tolist())
+
+
+class ReadingBuffer:
+    """Kružni spremnik zadnjih capacity očitanja u NumPy nizovima"""
+
+    __slots__ = ("ts", "temperature", "aqi", "end", "size")
+
+    def __init__(self, capacity: int):
+        self.ts = np.empty(capacity)
+        self.temperature = np.empty(capacity)
+        self.aqi = np.empty(capacity)
+        self.end = 0
+        self.size = 0
+
+    def append(self, ts: float, temperature: float, aqi: float):
+        self.ts[self.end] = ts
+        self.temperature[self.end] = temperature
+        self.aqi[self.end] = aqi
+        self.end = (self.end + 1) % len(self.ts)
+        self.size = min(self.size + 1, len(self.ts))
+
+    def replace(self, columns: ReadingColumns):
+        capacity = len(self.ts)
+        count = min(len(columns), capacity)
+        self.ts[:count] = columns.ts[len(columns) - count:]
+        self.temperature[:count] = columns.temperature[len(columns) - count:]
+        self.aqi[:count] = columns.aqi[len(columns) - count:]
+        self.end = count % capacity
+        self.size = count
+
+    def columns(self) -> ReadingColumns:
+        """Kopija sadržaja, od najstarijeg prema najnovijem"""
+        if self.size < len(self.ts):
+            return ReadingColumns(self.ts[:self.size].copy(), self.temperature[:self.size].copy(),
+                                  self.aqi[:self.size].copy())
+        order = np.r_[self.end:self.size, 0:self.end]
+        return ReadingColumns(self.ts[order], self.temperature[order], self.aqi[order])
@@ -1,40 +1,103 @@
-from fastapi import FastAPI, HTTPException
-from typing import Dict, List
+from fastapi import FastAPI, HTTPException, Request, Response, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import asyncio
 import aiohttp
+import time
 import os
 
-from models import SensorStats, AggregatedStats, TrendAnalysis, ProcessingStatus
-from services import StorageClient, StatisticsCalculator
+from models import (
+    SensorStats, AggregatedStats, TrendAnalysis, ProcessingStatus,
+    ReadingEvent, Anomaly, AreaStats, NearbySensor
+)
+from services import StorageClient, StatisticsCalculator, ReadingStore, SensorRegistry
+from cache import ResponseCache, CachedResponse, etag_matches
+from stream import StatsBroadcaster, Subscriber
+from windows import WINDOWS, SensorWindows, to_epoch
+from anomaly import AnomalyDetector
+from spatial import SpatialIndex
+from stats_store import StatsStore, StatsRecord
+from shared.fastjson import json_serialize, response_class
+from shared import tracing
+from shared.readiness import Readiness, wait_for_service
 
 app = FastAPI(
     title="Processing Service",
     description="Servis za statističku obradu podataka senzora",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=response_class()
 )
+tracing.setup(app, "processing")
 
 # Konfiguracija
 STORAGE_SERVICE_URL = os.getenv("STORAGE_SERVICE_URL", "http://localhost:8001")
 PROCESSING_INTERVAL = int(os.getenv("PROCESSING_INTERVAL", "60"))
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "0.5"))
+GRID_CELL_DEGREES = float(os.getenv("GRID_CELL_DEGREES", "0.5"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4.0"))
+ANOMALY_STUCK_COUNT = int(os.getenv("ANOMALY_STUCK_COUNT", "10"))
+ANOMALY_TEMP_RATE = float(os.getenv("ANOMALY_TEMP_RATE", "5.0"))
+ANOMALY_AQI_RATE = float(os.getenv("ANOMALY_AQI_RATE", "100.0"))
+STREAM_MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", "1000"))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+STATS_CACHE_CAPACITY = int(os.getenv("STATS_CACHE_CAPACITY", "100000"))
+STATS_TTL = float(os.getenv("STATS_TTL", "86400"))
+SENSOR_PAGE_SIZE = int(os.getenv("SENSOR_PAGE_SIZE", "1000"))
+# Preklapanje sinkronizacije senzora (s) - senzori commitani izvan redoslijeda created_at
+SENSOR_SYNC_LAG = float(os.getenv("SENSOR_SYNC_LAG", "30"))
+STARTUP_RETRY_INTERVAL = float(os.getenv("STARTUP_RETRY_INTERVAL", "5"))
 
 # Globalne varijable
 client_session: aiohttp.ClientSession = None
 storage_client: StorageClient = None
 processing_task = None
-stats_cache: Dict[str, SensorStats] = {}
+flush_task = None
+sensor_registry = SensorRegistry(page_size=SENSOR_PAGE_SIZE, lag=SENSOR_SYNC_LAG)
+reading_store = ReadingStore()
+sensor_windows: Dict[str, SensorWindows] = {}
+spatial_index = SpatialIndex(cell_size=GRID_CELL_DEGREES)
+anomaly_detector = AnomalyDetector(
+    z_threshold=ANOMALY_Z_THRESHOLD,
+    stuck_count=ANOMALY_STUCK_COUNT,
+    max_rate={"temperature": ANOMALY_TEMP_RATE, "aqi": ANOMALY_AQI_RATE}
+)
+events_received = 0
+stats_store = StatsStore(
+    capacity=STATS_CACHE_CAPACITY,
+    ttl=STATS_TTL,
+    on_evict=lambda sensor_id: forget_sensor(sensor_id)
+)
 last_processing_time: datetime = None
 next_processing_time: datetime = None
+response_cache = ResponseCache()
+broadcaster = StatsBroadcaster(max_pending=STREAM_MAX_PENDING)
+readiness = Readiness("processing")
+
+STATS_PAGE_DEFAULT = 1000
+STATS_PAGE_MAX = 10000
+
+sensor_stats_list = TypeAdapter(List[SensorStats])
+area_stats_list = TypeAdapter(List[AreaStats])
+
+AQI_RECOMMENDATIONS = {
+    "good": "Kvaliteta zraka je odlična.",
+    "moderate": "Kvaliteta zraka je prihvatljiva.",
+    "unhealthy": "Preporučuje se izbjegavanje aktivnosti vani.",
+    "hazardous": "Opasno! Ostanite unutra."
+}
 
 @app.on_event("startup")
 async def startup_event():
-    global client_session, storage_client, processing_task, next_processing_time
+    global client_session, storage_client, processing_task, flush_task, next_processing_time
     
-    client_session = aiohttp.ClientSession()
+    client_session = aiohttp.ClientSession(json_serialize=json_serialize)
     storage_client = StorageClient(STORAGE_SERVICE_URL, client_session)
     
     # Pokreni background processing
     processing_task = asyncio.create_task(periodic_processing())
+    flush_task = asyncio.create_task(event_flush_loop())
     next_processing_time = datetime.utcnow() + timedelta(seconds=PROCESSING_INTERVAL)
     
     print(f" Processing Service started (port 8003)")
@@ -44,43 +107,209 @@ async def startup_event():
 async def shutdown_event():
     if processing_task:
         processing_task.cancel()
+    if flush_task:
+        flush_task.cancel()
     if client_session:
         await client_session.close()
 
 async def process_all_sensors():
     """Glavni processing logic"""
-    global stats_cache, last_processing_time, next_processing_time
+    global last_processing_time, next_processing_time
     
-    sensors = await storage_client.get_sensors()
-    if not sensors:
+    # Iz storagea se čitaju samo senzori dodani od prošlog ciklusa
+    for sensor in await sensor_registry.sync(storage_client):
+        spatial_index.upsert_sensor(sensor["id"], sensor.get("latitude"), sensor.get("longitude"), sensor.get("location"))
+    if not len(sensor_registry):
         return
     
-    print(f" Processing {len(sensors)} sensors...")
+    print(f" Processing {len(sensor_registry)} sensors...")
     
-    for sensor in sensors:
-        sensor_id = sensor["id"]
-        data = await storage_client.get_sensor_data(sensor_id)
+    # Senzori koji šalju evente već imaju svježa očitanja u memoriji
+    resynced = 0
+    for sensor_id in sensor_registry.ids():
+        if not reading_store.needs_resync(sensor_id, PROCESSING_INTERVAL):
+            continue
         
-        if data:
-            stats = StatisticsCalculator.calculate(sensor_id, data)
-            if stats:
-                stats_cache[sensor_id] = stats
-                print(f" {sensor_id}: {stats.data_points} points")
+        columns = await storage_client.get_sensor_data(sensor_id)
+        # Senzor bez svježih očitanja ne ulazi u cache (TTL)
+        if len(columns) and stats_store.is_active(columns.ts[-1]):
+            reading_store.replace(sensor_id, columns)
+            for ts, temperature, aqi in columns.rows():
+                observe_reading(sensor_id, ts, temperature, aqi)
+            resynced += 1
+    
+    updated = recalculate_dirty_sensors()
+    expired = stats_store.expire()
+    print(f" Updated {updated} sensors ({resynced} read from storage, {len(expired)} expired)")
     
     last_processing_time = datetime.utcnow()
     next_processing_time = last_processing_time + timedelta(seconds=PROCESSING_INTERVAL)
+    refresh_response_cache()
+
+def update_sensor_stats(stats: SensorStats):
+    """Spremi novu statistiku i odmah je pošalji live pretplatnicima"""
+    changed = stats_store.put(stats)
+    if changed is None:
+        # Neaktivan senzor (TTL) - ne drži mu se ni očitanja ni prozori
+        forget_sensor(stats.sensor_id)
+        return
+    response_cache.invalidate(f"stats:{stats.sensor_id}", f"trend:{stats.sensor_id}")
+    spatial_index.update_stats(stats.sensor_id, stats.temperature_avg, stats.aqi_avg, stats.data_points)
+    
+    # Šalju se samo promjene - senzor bez novih očitanja ne generira poruku
+    if not changed:
+        return
+    broadcaster.publish(stats.sensor_id, build_sensor_body(stats))
+
+def forget_sensor(sensor_id: str):
+    """Senzor izbačen iz cachea - oslobodi i ostalo stanje koje se za njega drži"""
+    reading_store.discard(sensor_id)
+    sensor_windows.pop(sensor_id, None)
+    anomaly_detector.forget(sensor_id)
+    spatial_index.clear_stats(sensor_id)
+    response_cache.invalidate(f"stats:{sensor_id}", f"trend:{sensor_id}", "aggregated", "regions", "cities")
+    response_cache.invalidate_prefix("stats?")
+
+# Predserijalizirani odgovori
+def build_stats_body(records: List[StatsRecord]) -> bytes:
+    return sensor_stats_list.dump_json([record.to_stats() for record in records])
+
+def build_aggregated_body() -> bytes:
+    sensors = [record.to_stats() for record in stats_store.records()]
+    temp_sum = aqi_sum = 0.0
+    total_points = 0
+    for s in sensors:
+        temp_sum += s.temperature_avg
+        aqi_sum += s.aqi_avg
+        total_points += s.data_points
+    
+    return AggregatedStats(
+        total_sensors=len(sensors),
+        total_data_points=total_points,
+        global_temp_avg=temp_sum / len(sensors) if sensors else 0,
+        global_aqi_avg=aqi_sum / len(sensors) if sensors else 0,
+        sensors=sensors
+    ).model_dump_json().encode()
+
+def build_sensor_body(stats: SensorStats) -> bytes:
+    return stats.model_dump_json().encode()
+
+def build_trend(stats: SensorStats) -> TrendAnalysis:
+    aqi_status = StatisticsCalculator.classify_aqi(stats.aqi_avg)
+    return TrendAnalysis(
+        sensor_id=stats.sensor_id,
+        temperature_trend=StatisticsCalculator.analyze_trend(stats),
+        aqi_status=aqi_status,
+        recommendation=AQI_RECOMMENDATIONS.get(aqi_status, ""),
+        last_analysis=stats.last_updated
+    )
+
+def build_trend_body(stats: SensorStats) -> bytes:
+    return build_trend(stats).model_dump_json().encode()
+
+def build_regions_body() -> bytes:
+    return area_stats_list.dump_json([AreaStats(**area) for area in spatial_index.regions()])
+
+def build_cities_body() -> bytes:
+    return area_stats_list.dump_json([AreaStats(**area) for area in spatial_index.cities()])
+
+def refresh_response_cache():
+    """Nova verzija odgovora - gradi se jednom po processing ciklusu"""
+    response_cache.invalidate_all()
+    if not len(stats_store):
+        return
+    # Tijela po senzoru grade se tek na zahtjev, da cache ne drži kopiju svakog senzora
+    stats_page(0, STATS_PAGE_DEFAULT)
+    response_cache.get_or_build("aggregated", build_aggregated_body)
+
+def stats_page(offset: int, limit: int):
+    """Nefiltrirana stranica /stats; vraća (ukupno, CachedResponse).
+
+    U cacheu se drži samo zadana prva stranica - parova offset/limit ima
+    proizvoljno mnogo, pa se ostale stranice grade za svaki zahtjev.
+    """
+    def build() -> bytes:
+        return build_stats_body(stats_store.page(offset, limit)[1])
+    if offset == 0 and limit == STATS_PAGE_DEFAULT:
+        return len(stats_store), response_cache.get_or_build(f"stats?offset={offset}&limit={limit}", build)
+    return len(stats_store), CachedResponse(build(), response_cache.version)
+
+def cached_json(request: Request, entry: CachedResponse, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Vrati gotove bajtove ili 304 ako klijent već ima tu verziju"""
+    headers = {**(headers or {}), "ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def observe_reading(sensor_id: str, ts: float, temperature: float, aqi: float):
+    """Streaming obrada očitanja: vremenski prozori i detekcija anomalija"""
+    windows = sensor_windows.get(sensor_id)
+    if windows is None:
+        windows = sensor_windows[sensor_id] = SensorWindows()
+    # Prozori odbacuju već viđena očitanja, pa ih ni detektor ne vidi dvaput
+    if windows.add(ts, temperature, aqi):
+        anomaly_detector.observe(sensor_id, ts, temperature, aqi)
+
+def window_stats(sensor_id: str, window: str) -> SensorStats:
+    """Statistika senzora za zadani vremenski prozor"""
+    if window not in WINDOWS:
+        raise HTTPException(400, f"Nepoznat prozor {window}. Dozvoljeno: {', '.join(WINDOWS)}")
+    windows = sensor_windows.get(sensor_id)
+    snapshot = windows.get(window, time.time()).snapshot() if windows else None
+    if not snapshot:
+        raise HTTPException(404, f"Nema podataka za {sensor_id} u zadnjih {window}")
+    return SensorStats(sensor_id=sensor_id, window=window, **snapshot)
+
+def recalculate_dirty_sensors() -> int:
+    """Preračunaj statistiku senzora s novim očitanjima"""
+    dirty = reading_store.pop_dirty()
+    if not dirty:
+        return 0
+    with tracing.span("recalculate_dirty_sensors", sensors=len(dirty)):
+        for sensor_id in dirty:
+            with tracing.span("StatisticsCalculator.calculate_columns", sensor_id=sensor_id):
+                stats = StatisticsCalculator.calculate_columns(sensor_id, reading_store.get(sensor_id))
+            if stats:
+                stats.anomalies = anomaly_detector.active(sensor_id)
+                stats.anomaly_count = anomaly_detector.total(sensor_id)
+                update_sensor_stats(stats)
+    response_cache.invalidate("aggregated", "regions", "cities")
+    response_cache.invalidate_prefix("stats?")
+    return len(dirty)
+
+async def event_flush_loop():
+    """Background task - statistika iz evenata, u batchevima"""
+    while True:
+        await asyncio.sleep(STATS_FLUSH_INTERVAL)
+        try:
+            recalculate_dirty_sensors()
+        except Exception as e:
+            print(f" Error: {e}")
 
 async def periodic_processing():
-    """Background task"""
+    """Background task - čeka storage, prvim ciklusom puni cache, zatim radi periodički"""
+    await wait_for_service(client_session, f"{STORAGE_SERVICE_URL}/ready", "storage")
+    readiness.checks["storage"] = True
+    
     while True:
         try:
-            await process_all_sensors()
+            with tracing.span("process_all_sensors"):
+                await process_all_sensors()
+            if not readiness.ready:
+                readiness.checks["cache_warm"] = True
+                readiness.mark_ready()
         except Exception as e:
             print(f" Error: {e}")
         
-        await asyncio.sleep(PROCESSING_INTERVAL)
+        # Dok prvi ciklus ne uspije, ne čeka se cijeli PROCESSING_INTERVAL
+        await asyncio.sleep(PROCESSING_INTERVAL if readiness.ready else STARTUP_RETRY_INTERVAL)
 
 # Endpoints
+@app.get("/ready")
+async def ready():
+    """Readiness - storage je dostupan i statistike su izračunate prvim ciklusom"""
+    return JSONResponse(readiness.to_dict(), status_code=200 if readiness.ready else 503)
+
 @app.get("/health")
 async def health():
     storage_healthy = await storage_client.check_health() if storage_client else False
@@ -88,80 +317,239 @@ async def health():
     return {
         "status": "healthy",
         "storage_connection": storage_healthy,
-        "cached_sensors": len(stats_cache),
+        "known_sensors": len(sensor_registry),
+        "cached_sensors": len(stats_store),
+        "evicted_sensors": stats_store.evicted,
+        "response_cache_version": response_cache.version,
+        "live_subscribers": broadcaster.subscribers,
+        "events_received": events_received,
         "last_processing": last_processing_time,
         "next_processing": next_processing_time
     }
 
 @app.get("/stats", response_model=List[SensorStats])
-async def get_all_stats():
-    if not stats_cache:
-        raise HTTPException(404, "Nema statistika. Pričekajte processing...")
-    return list(stats_cache.values())
+async def get_all_stats(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(STATS_PAGE_DEFAULT, ge=1, le=STATS_PAGE_MAX),
+    city: Optional[str] = Query(None, description="Samo senzori iz zadanog grada"),
+    anomalous: Optional[bool] = Query(None, description="Samo senzori s (true) ili bez (false) aktivnih anomalija"),
+    min_aqi: Optional[float] = Query(None, ge=0, description="Samo senzori s prosječnim AQI-jem barem ovoliko")
+):
+    """Statistike senzora sortirane po sensor_id, po stranicama.
 
-@app.get("/stats/aggregated", response_model=AggregatedStats)
-async def get_aggregated():
-    if not stats_cache:
-        raise HTTPException(404, "Nema podataka")
+    Ukupan broj senzora koji odgovaraju filteru vraća se u X-Total-Count.
+    """
+    if not len(stats_store):
+        raise HTTPException(404, "Nema statistika. Pričekajte processing...")
     
-    all_temps = [s.temperature_avg for s in stats_cache.values()]
-    all_aqis = [s.aqi_avg for s in stats_cache.values()]
-    total_points = sum(s.data_points for s in stats_cache.values())
+    if city is None and anomalous is None and min_aqi is None:
+        total, entry = stats_page(offset, limit)
+        return cached_json(request, entry, {"X-Total-Count": str(total)})
     
-    return AggregatedStats(
-        total_sensors=len(stats_cache),
-        total_data_points=total_points,
-        global_temp_avg=sum(all_temps) / len(all_temps) if all_temps else 0,
-        global_aqi_avg=sum(all_aqis) / len(all_aqis) if all_aqis else 0,
-        sensors=list(stats_cache.values())
+    def matches(record: StatsRecord) -> bool:
+        if anomalous is not None and bool(record.anomalies) != anomalous:
+            return False
+        if min_aqi is not None and record.aqi_avg < min_aqi:
+            return False
+        if city is not None:
+            place = spatial_index.location(record.sensor_id)
+            return place is not None and place.city == city
+        return True
+    
+    total, records = stats_store.page(offset, limit, matches)
+    return Response(
+        content=build_stats_body(records),
+        media_type="application/json",
+        headers={"X-Total-Count": str(total)}
     )
 
+@app.get("/stats/aggregated", response_model=AggregatedStats)
+async def get_aggregated(request: Request):
+    if not len(stats_store):
+        raise HTTPException(404, "Nema podataka")
+    return cached_json(request, response_cache.get_or_build("aggregated", build_aggregated_body))
+
+@app.get("/stats/regions", response_model=List[AreaStats])
+async def get_regions(request: Request):
+    """Agregati po regijama (ćelijama prostorne mreže)"""
+    return cached_json(request, response_cache.get_or_build("regions", build_regions_body))
+
+@app.get("/stats/regions/{region_id}", response_model=AreaStats)
+async def get_region(region_id: str):
+    area = spatial_index.region(region_id)
+    if not area:
+        raise HTTPException(404, f"Nema podataka za regiju {region_id}")
+    return area
+
+@app.get("/stats/cities", response_model=List[AreaStats])
+async def get_cities(request: Request):
+    """Agregati po gradovima (lokacija senzora)"""
+    return cached_json(request, response_cache.get_or_build("cities", build_cities_body))
+
+@app.get("/stats/cities/{city}", response_model=AreaStats)
+async def get_city(city: str):
+    area = spatial_index.city(city)
+    if not area:
+        raise HTTPException(404, f"Nema podataka za grad {city}")
+    return area
+
+@app.get("/sensors/nearest", response_model=List[NearbySensor])
+async def get_nearest_sensors(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    n: int = Query(5, ge=1, le=100)
+):
+    """Najbližih N senzora zadanoj točki"""
+    result = []
+    for distance, sensor_id in spatial_index.nearest(lat, lon, n):
+        place = spatial_index.location(sensor_id)
+        result.append(NearbySensor(
+            sensor_id=sensor_id,
+            city=place.city,
+            latitude=place.latitude,
+            longitude=place.longitude,
+            distance_km=round(distance, 2),
+            stats=stats_store.get(sensor_id)
+        ))
+    return result
+
 
 @app.get("/stats/{sensor_id}", response_model=SensorStats)
-async def get_sensor_stats(sensor_id: str):
-    if sensor_id not in stats_cache:
+async def get_sensor_stats(
+    sensor_id: str,
+    request: Request,
+    window: Optional[str] = Query(None, description="Vremenski prozor: 1m, 15m, 1h ili 24h")
+):
+    if window:
+        return window_stats(sensor_id, window)
+    if sensor_id not in stats_store:
         raise HTTPException(404, f"Nema statistike za {sensor_id}")
-    return stats_cache[sensor_id]
+    # Zapis se pretvara u model samo kad tijelo nije u cacheu
+    return cached_json(
+        request,
+        response_cache.get_or_build(f"stats:{sensor_id}", lambda: build_sensor_body(stats_store.get(sensor_id)))
+    )
+
+@app.post("/events/readings")
+async def receive_readings(events: List[ReadingEvent]):
+    """Event stream iz collectora - očitanja odmah nakon spremanja"""
+    global events_received
+    
+    for event in events:
+        ts = to_epoch(event.timestamp)
+        if ts is None:
+            ts = time.time()
+        reading_store.append(event.sensor_id, ts, event.temperature, event.aqi)
+        observe_reading(event.sensor_id, ts, event.temperature, event.aqi)
+    events_received += len(events)
+    return {"accepted": len(events)}
+
+@app.get("/anomalies", response_model=List[Anomaly])
+async def get_anomalies(
+    sensor_id: Optional[str] = Query(None, description="Filter po senzoru"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Najnovije detektirane anomalije"""
+    return [event.to_dict() for event in anomaly_detector.latest(sensor_id, limit)]
 
 @app.post("/process", response_model=ProcessingStatus)
 async def trigger_processing():
     await process_all_sensors()
     return ProcessingStatus(
         status="completed",
-        processed_sensors=len(stats_cache),
+        processed_sensors=len(stats_store),
         timestamp=datetime.utcnow(),
         next_run=next_processing_time
     )
 
 
 @app.get("/trends/{sensor_id}", response_model=TrendAnalysis)
-async def get_trend(sensor_id: str):
-    if sensor_id not in stats_cache:
+async def get_trend(
+    sensor_id: str,
+    request: Request,
+    window: Optional[str] = Query(None, description="Vremenski prozor: 1m, 15m, 1h ili 24h")
+):
+    if window:
+        return build_trend(window_stats(sensor_id, window))
+    if sensor_id not in stats_store:
         raise HTTPException(404, f"Nema podataka za {sensor_id}")
+    return cached_json(
+        request,
+        response_cache.get_or_build(f"trend:{sensor_id}", lambda: build_trend_body(stats_store.get(sensor_id)))
+    )
+
+
+# Live stream statistika
+def open_subscription(sensor_ids: Optional[List[str]]) -> Subscriber:
+    """Pretplati klijenta i odmah mu pošalji trenutno stanje senzora"""
+    subscriber = broadcaster.subscribe(sensor_ids)
+    for sensor_id in subscriber.sensor_ids or [record.sensor_id for record in stats_store.records()]:
+        if sensor_id in stats_store:
+            entry = response_cache.get_or_build(
+                f"stats:{sensor_id}", lambda: build_sensor_body(stats_store.get(sensor_id))
+            )
+            subscriber.offer(sensor_id, entry.body)
+    return subscriber
+
+@app.websocket("/ws/stats")
+async def stats_websocket(websocket: WebSocket, sensor_id: Optional[List[str]] = Query(None)):
+    """Live statistike preko WebSocketa.
+
+    Klijent može promijeniti filter porukom {"sensor_ids": [...]},
+    prazna lista ili null znači svi senzori.
+    """
+    await websocket.accept()
+    subscriber = open_subscription(sensor_id)
     
-    stats = stats_cache[sensor_id]
-    trend = StatisticsCalculator.analyze_trend(stats)
-    aqi_status = StatisticsCalculator.classify_aqi(stats.aqi_avg)
+    async def receive_filters():
+        try:
+            while True:
+                message = await websocket.receive_json()
+                if isinstance(message, dict) and isinstance(message.get("sensor_ids"), (list, type(None))):
+                    broadcaster.update_filter(subscriber, message["sensor_ids"])
+        except (WebSocketDisconnect, ValueError):
+            pass
+        finally:
+            broadcaster.unsubscribe(subscriber)
     
-    recommendations = {
-        "good": "Kvaliteta zraka je odlična.",
-        "moderate": "Kvaliteta zraka je prihvatljiva.",
-        "unhealthy": "Preporučuje se izbjegavanje aktivnosti vani.",
-        "hazardous": "Opasno! Ostanite unutra."
-    }
+    receiver = asyncio.create_task(receive_filters())
+    try:
+        while not subscriber.closed:
+            for payload in await subscriber.next_batch(STREAM_KEEPALIVE):
+                await websocket.send_text(payload.decode())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        broadcaster.unsubscribe(subscriber)
+
+@app.get("/stream/stats")
+async def stats_event_stream(request: Request, sensor_id: Optional[List[str]] = Query(None)):
+    """Live statistike kao Server-Sent Events"""
+    subscriber = open_subscription(sensor_id)
     
-    return TrendAnalysis(
-        sensor_id=sensor_id,
-        temperature_trend=trend,
-        aqi_status=aqi_status,
-        recommendation=recommendations.get(aqi_status, ""),
-        last_analysis=stats.last_updated
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                batch = await subscriber.next_batch(STREAM_KEEPALIVE)
+                if not batch:
+                    yield b": keepalive\n\n"
+                    continue
+                yield b"".join(b"event: stats\ndata: " + payload + b"\n\n" for payload in batch)
+        finally:
+            broadcaster.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8003, reload=True)
+    # Jedan worker - statistike, prozori i live pretplatnici žive u memoriji procesa
+    uvicorn.run(app, host="0.0.0.0", port=8003, workers=1)
 
 
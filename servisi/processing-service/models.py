@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import datetime
 
 class SensorStats(BaseModel):
@@ -15,6 +15,10 @@ class SensorStats(BaseModel):
     aqi_max: float = Field(..., ge=0, le=500)
     aqi_avg: float = Field(..., ge=0, le=500)
     aqi_std: Optional[float] = None
+    temperature_slope: Optional[float] = Field(None, description="Nagib temperature u °C/h")
+    window: Optional[str] = None
+    anomalies: List[str] = Field(default_factory=list, description="Aktivne anomalije, npr. aqi:zscore")
+    anomaly_count: int = Field(0, ge=0)
     last_updated: datetime = Field(default_factory=datetime.utcnow)
 
 class AggregatedStats(BaseModel):
@@ -25,6 +29,26 @@ class AggregatedStats(BaseModel):
     sensors: List[SensorStats]
     calculated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class AreaStats(BaseModel):
+    area: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    total_sensors: int = Field(..., ge=0)
+    total_data_points: int = Field(..., ge=0)
+    temperature_avg: float
+    aqi_avg: float
+    temperature_weighted_avg: float
+    aqi_weighted_avg: float
+    sensor_ids: List[str]
+
+class NearbySensor(BaseModel):
+    sensor_id: str
+    city: Optional[str] = None
+    latitude: float
+    longitude: float
+    distance_km: float
+    stats: Optional[SensorStats] = None
+
 class TrendAnalysis(BaseModel):
     sensor_id: str
     temperature_trend: str = Field(..., pattern="^(stable|increasing|decreasing|variable)$")
@@ -36,4 +60,18 @@ class ProcessingStatus(BaseModel):
     status: str
     processed_sensors: int
     timestamp: datetime
-    next_run: Optional[datetime] = None
\ No newline at end of file
+    next_run: Optional[datetime] = None
+
+class Anomaly(BaseModel):
+    sensor_id: str
+    metric: str = Field(..., pattern="^(temperature|aqi)$")
+    kind: str = Field(..., pattern="^(zscore|stuck|rate)$")
+    value: float
+    score: float
+    timestamp: datetime
+
+class ReadingEvent(BaseModel):
+    sensor_id: str
+    temperature: float
+    aqi: float
+    timestamp: Optional[Union[float, str]] = None
@@ -1,8 +1,15 @@
 import aiohttp
-from typing import List, Dict, Optional
-from datetime import datetime
-import statistics
+from typing import List, Dict, Optional, Set
+from datetime import datetime, timedelta
+import time
 from models import SensorStats
+from columns import ReadingColumns, ReadingBuffer
+from shared.fastjson import loads
+from shared.columnar import COLUMNAR_JSON, COLUMNAR_BINARY
+from shared import tracing
+
+# Nagib (°C/h) iznad kojeg se temperatura smatra rastućom ili padajućom
+TREND_SLOPE_THRESHOLD = 0.5
 
 class StorageClient:
     """Klijent za komunikaciju sa Storage servisom"""
@@ -11,30 +18,48 @@ class StorageClient:
         self.base_url = base_url
         self.session = session
     
-    async def get_sensors(self) -> List[Dict]:
-        """Dohvati sve senzore"""
+    async def get_sensors(
+        self,
+        since: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 1000
+    ) -> Optional[List[Dict]]:
+        """Dohvati stranicu senzora kreiranih nakon watermarka (created_at, id).
+
+        Vraća None ako storage nije dostupan, da se to razlikuje od prazne stranice.
+        """
+        params = {"limit": limit}
+        if since is not None:
+            params["since"] = since
+            if after is not None:
+                params["after"] = after
         try:
-            async with self.session.get(f"{self.base_url}/sensors") as resp:
+            async with self.session.get(f"{self.base_url}/sensors", params=params, headers=tracing.inject()) as resp:
                 if resp.status == 200:
-                    return await resp.json()
-                return []
+                    return await resp.json(loads=loads)
+                return None
         except Exception as e:
             print(f"Error fetching sensors: {e}")
-            return []
+            return None
     
-    async def get_sensor_data(self, sensor_id: str, limit: int = 100) -> List[Dict]:
-        """Dohvati podatke za senzor"""
+    async def get_sensor_data(self, sensor_id: str, limit: int = 100) -> ReadingColumns:
+        """Dohvati podatke za senzor kao stupce (binarno, JSON ili stari redovi)"""
         try:
             async with self.session.get(
                 f"{self.base_url}/data",
-                params={"sensor_id": sensor_id, "limit": limit}
+                params={"sensor_id": sensor_id, "limit": limit},
+                headers=tracing.inject({"Accept": f"{COLUMNAR_BINARY}, {COLUMNAR_JSON};q=0.9, application/json;q=0.5"})
             ) as resp:
-                if resp.status == 200:
-                    return await resp.json()
-                return []
+                if resp.status != 200:
+                    return ReadingColumns.empty()
+                if resp.content_type == COLUMNAR_BINARY:
+                    return ReadingColumns.from_binary(await resp.read())
+                if resp.content_type == COLUMNAR_JSON:
+                    return ReadingColumns.from_json(await resp.json(loads=loads, content_type=None))
+                return ReadingColumns.from_rows(await resp.json(loads=loads))
         except Exception as e:
             print(f"Error fetching data for {sensor_id}: {e}")
-            return []
+            return ReadingColumns.empty()
     
     async def check_health(self) -> bool:
         """Provjeri health storage servisa"""
@@ -47,62 +72,163 @@ class StorageClient:
         except:
             return False
 
+class SensorRegistry:
+    """Registar poznatih senzora, sinkroniziran inkrementalno.
+
+    Storage vraća senzore poredane po (created_at, id); registar pamti
+    najnoviji primljeni created_at kao watermark i u idućem ciklusu traži
+    samo senzore kreirane nakon njega, stranicu po stranicu. created_at se
+    postavlja prije commita, a storage ima više workera, pa senzor s
+    ranijim created_at može postati vidljiv nakon kasnijeg - zato svaka
+    sinkronizacija kreće od watermarka umanjenog za lag, a već poznati
+    senzori se preskaču po id-u.
+    """
+    
+    def __init__(self, page_size: int = 1000, lag: float = 30):
+        self.page_size = page_size
+        self.lag = lag
+        self.since: Optional[str] = None
+        self._ids: Dict[str, None] = {}  # poredak dodavanja
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def ids(self) -> List[str]:
+        return list(self._ids)
+    
+    def _resume_point(self) -> Optional[str]:
+        if self.since is None:
+            return None
+        return (datetime.fromisoformat(self.since) - timedelta(seconds=self.lag)).isoformat()
+    
+    async def sync(self, client: StorageClient) -> List[Dict]:
+        """Dohvati nove senzore od zadnjeg watermarka (minus lag) i vrati ih"""
+        added: List[Dict] = []
+        since, after = self._resume_point(), None
+        while True:
+            page = await client.get_sensors(since, after, self.page_size)
+            if not page:
+                return added
+            for sensor in page:
+                if sensor["id"] not in self._ids:
+                    self._ids[sensor["id"]] = None
+                    added.append(sensor)
+            last = page[-1]
+            since, after = last["created_at"], last["id"]
+            self.since = since
+            if len(page) < self.page_size:
+                return added
+
+class ReadingStore:
+    """Nedavna očitanja po senzoru, punjena event streamom iz collectora.
+
+    Storage se čita samo za senzore koji nemaju svježih evenata, pa u
+    normalnom radu statistika ne ovisi o periodičnom re-readu. Očitanja
+    se drže u NumPy kružnim spremnicima, spremnima za izračun statistike.
+    """
+    
+    def __init__(self, max_readings: int = 100):
+        self.max_readings = max_readings
+        self._readings: Dict[str, ReadingBuffer] = {}
+        self._last_event: Dict[str, float] = {}
+        self._seeded: Set[str] = set()
+        self._dirty: Set[str] = set()
+    
+    def _buffer(self, sensor_id: str) -> ReadingBuffer:
+        buffer = self._readings.get(sensor_id)
+        if buffer is None:
+            buffer = self._readings[sensor_id] = ReadingBuffer(self.max_readings)
+        return buffer
+    
+    def append(self, sensor_id: str, ts: float, temperature: float, aqi: float):
+        """Dodaj očitanje iz event streama"""
+        self._buffer(sensor_id).append(ts, temperature, aqi)
+        self._last_event[sensor_id] = time.monotonic()
+        self._dirty.add(sensor_id)
+    
+    def replace(self, sensor_id: str, columns: ReadingColumns):
+        """Zamijeni očitanja podacima iz storagea"""
+        self._buffer(sensor_id).replace(columns)
+        self._seeded.add(sensor_id)
+        self._dirty.add(sensor_id)
+    
+    def get(self, sensor_id: str) -> ReadingColumns:
+        buffer = self._readings.get(sensor_id)
+        return buffer.columns() if buffer else ReadingColumns.empty()
+    
+    def needs_resync(self, sensor_id: str, max_age: float) -> bool:
+        """Treba li senzor učitati iz storagea.
+
+        Da - ako još nije učitan ili nije slao evente u zadnjih max_age sekundi.
+        """
+        if sensor_id not in self._seeded:
+            return True
+        last = self._last_event.get(sensor_id)
+        return last is None or time.monotonic() - last >= max_age
+    
+    def discard(self, sensor_id: str):
+        """Zaboravi senzor (izbačen iz cachea statistika)"""
+        self._readings.pop(sensor_id, None)
+        self._last_event.pop(sensor_id, None)
+        self._seeded.discard(sensor_id)
+        self._dirty.discard(sensor_id)
+    
+    def pop_dirty(self) -> Set[str]:
+        """Senzori s novim očitanjima od zadnjeg poziva"""
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
 class StatisticsCalculator:
     """Kalkulator za statističke podatke"""
     
     @staticmethod
     def calculate(sensor_id: str, data_points: List[Dict]) -> Optional[SensorStats]:
-        """Izračunaj statistiku iz podataka"""
-        if not data_points:
+        """Izračunaj statistiku iz redova (najnoviji prvi, kao u /data)"""
+        return StatisticsCalculator.calculate_columns(sensor_id, ReadingColumns.from_rows(data_points))
+    
+    @staticmethod
+    def calculate_columns(sensor_id: str, columns: ReadingColumns) -> Optional[SensorStats]:
+        """Izračunaj statistiku nad NumPy stupcima, bez prolaska po redovima"""
+        count = len(columns)
+        if not count:
             return None
         
-        temperatures = []
-        aqis = []
-        timestamps = []
-        
-        for point in data_points:
-            if "temperature" in point:
-                temperatures.append(point["temperature"])
-            if "aqi" in point:
-                aqis.append(point["aqi"])
-            if "timestamp" in point:
-                ts = point["timestamp"]
-                if isinstance(ts, str):
-                    timestamps.append(datetime.fromisoformat(ts.replace("Z", "+00:00")))
-                elif isinstance(ts, (int, float)):
-                    timestamps.append(datetime.fromtimestamp(ts))
-        
-        if not temperatures or not aqis:
-            return None
+        ts, temperatures, aqis = columns.ts, columns.temperature, columns.aqi
+        start = float(ts.min())
         
-        period_start = min(timestamps) if timestamps else datetime.utcnow()
-        period_end = max(timestamps) if timestamps else datetime.utcnow()
+        slope = None
+        if count > 1:
+            hours = (ts - start) / 3600
+            dx = hours - hours.mean()
+            sxx = float(dx @ dx)
+            if sxx > 0:
+                slope = round(float(dx @ (temperatures - temperatures.mean())) / sxx, 3)
         
         return SensorStats(
             sensor_id=sensor_id,
-            period_start=period_start,
-            period_end=period_end,
-            data_points=len(data_points),
-            temperature_min=min(temperatures),
-            temperature_max=max(temperatures),
-            temperature_avg=round(statistics.mean(temperatures), 2),
-            temperature_std=round(statistics.stdev(temperatures), 2) if len(temperatures) > 1 else None,
-            aqi_min=min(aqis),
-            aqi_max=max(aqis),
-            aqi_avg=round(statistics.mean(aqis), 2),
-            aqi_std=round(statistics.stdev(aqis), 2) if len(aqis) > 1 else None
+            period_start=datetime.utcfromtimestamp(start),
+            period_end=datetime.utcfromtimestamp(float(ts.max())),
+            data_points=count,
+            temperature_min=float(temperatures.min()),
+            temperature_max=float(temperatures.max()),
+            temperature_avg=round(float(temperatures.mean()), 2),
+            temperature_std=round(float(temperatures.std(ddof=1)), 2) if count > 1 else None,
+            aqi_min=float(aqis.min()),
+            aqi_max=float(aqis.max()),
+            aqi_avg=round(float(aqis.mean()), 2),
+            aqi_std=round(float(aqis.std(ddof=1)), 2) if count > 1 else None,
+            temperature_slope=slope
         )
     
     @staticmethod
     def analyze_trend(stats: SensorStats) -> str:
-        """Analiziraj trend temperature"""
-        if not stats.temperature_std:
-            return "stable"
-        if stats.temperature_std > 3:
+        """Analiziraj trend temperature iz nagiba linearne regresije"""
+        slope = stats.temperature_slope
+        if slope is not None and abs(slope) >= TREND_SLOPE_THRESHOLD:
+            return "increasing" if slope > 0 else "decreasing"
+        if stats.temperature_std and stats.temperature_std > 3:
             return "variable"
-        if stats.temperature_std < 1:
-            return "stable"
-        return "moderate"
+        return "stable"
     
     @staticmethod
     def classify_aqi(aqi: float) -> str:
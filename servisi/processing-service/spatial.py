@@ -0,0 +1,236 @@
+from typing import Dict, List, Optional, Set, Tuple
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Udaljenost dviju točaka na Zemlji u kilometrima"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class AreaAggregate:
+    """Zbrojevi za jednu regiju ili grad, ažurirani inkrementalno"""
+
+    __slots__ = ("sensors", "data_points", "temp_sum", "aqi_sum", "temp_weighted", "aqi_weighted")
+
+    def __init__(self):
+        self.sensors: Set[str] = set()
+        self.data_points = 0
+        self.temp_sum = 0.0
+        self.aqi_sum = 0.0
+        self.temp_weighted = 0.0
+        self.aqi_weighted = 0.0
+
+    def apply(self, sensor_id: str, values: Tuple[float, float, int], sign: int):
+        temperature, aqi, points = values
+        if sign > 0:
+            self.sensors.add(sensor_id)
+        else:
+            self.sensors.discard(sensor_id)
+        self.data_points += sign * points
+        self.temp_sum += sign * temperature
+        self.aqi_sum += sign * aqi
+        self.temp_weighted += sign * temperature * points
+        self.aqi_weighted += sign * aqi * points
+
+    def to_dict(self) -> Dict:
+        count = len(self.sensors)
+        return {
+            "total_sensors": count,
+            "total_data_points": self.data_points,
+            "temperature_avg": round(self.temp_sum / count, 2) if count else 0.0,
+            "aqi_avg": round(self.aqi_sum / count, 2) if count else 0.0,
+            "temperature_weighted_avg": round(self.temp_weighted / self.data_points, 2) if self.data_points else 0.0,
+            "aqi_weighted_avg": round(self.aqi_weighted / self.data_points, 2) if self.data_points else 0.0,
+            "sensor_ids": sorted(self.sensors),
+        }
+
+
+class _SensorPlace:
+    __slots__ = ("latitude", "longitude", "city", "cell", "values")
+
+    def __init__(self):
+        self.latitude: Optional[float] = None
+        self.longitude: Optional[float] = None
+        self.city: Optional[str] = None
+        self.cell: Optional[Tuple[int, int]] = None
+        self.values: Optional[Tuple[float, float, int]] = None
+
+
+class SpatialIndex:
+    """Prostorni indeks senzora nad pravilnom mrežom (lat/lon ćelije).
+
+    Ćelija mreže je regija. Agregati regija i gradova drže se unaprijed
+    izračunati i mijenjaju se samo za senzor čija se statistika promijenila,
+    pa regionalni upit ne prolazi kroz sve senzore. Najbližih N senzora
+    traži se širenjem prstena ćelija oko zadane točke.
+    """
+
+    def __init__(self, cell_size: float = 0.5):
+        self.cell_size = cell_size
+        self._places: Dict[str, _SensorPlace] = {}
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._regions: Dict[Tuple[int, int], AreaAggregate] = {}
+        self._cities: Dict[str, AreaAggregate] = {}
+
+    def cell_of(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size))
+
+    def region_id(self, cell: Tuple[int, int]) -> str:
+        return f"{cell[0]}:{cell[1]}"
+
+    def region_center(self, cell: Tuple[int, int]) -> Tuple[float, float]:
+        return ((cell[0] + 0.5) * self.cell_size, (cell[1] + 0.5) * self.cell_size)
+
+    def upsert_sensor(
+        self,
+        sensor_id: str,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        city: Optional[str]
+    ):
+        """Dodaj senzor ili ažuriraj njegovu lokaciju"""
+        place = self._places.get(sensor_id)
+        if place is None:
+            place = self._places[sensor_id] = _SensorPlace()
+        cell = self.cell_of(latitude, longitude) if latitude is not None and longitude is not None else None
+        if place.cell == cell and place.city == city:
+            place.latitude, place.longitude = latitude, longitude
+            return
+
+        self._contribute(sensor_id, place, -1)
+        if place.cell is not None:
+            self._discard(self._cells, place.cell, sensor_id)
+        place.latitude, place.longitude = latitude, longitude
+        place.cell, place.city = cell, city
+        if cell is not None:
+            self._cells.setdefault(cell, set()).add(sensor_id)
+        self._contribute(sensor_id, place, 1)
+
+    def update_stats(self, sensor_id: str, temperature_avg: float, aqi_avg: float, data_points: int):
+        """Zamijeni doprinos senzora u agregatima njegove regije i grada"""
+        place = self._places.get(sensor_id)
+        if place is None:
+            place = self._places[sensor_id] = _SensorPlace()
+        self._contribute(sensor_id, place, -1)
+        place.values = (temperature_avg, aqi_avg, data_points)
+        self._contribute(sensor_id, place, 1)
+
+    def clear_stats(self, sensor_id: str):
+        """Ukloni doprinos senzora iz agregata; lokacija ostaje u indeksu"""
+        place = self._places.get(sensor_id)
+        if place is not None:
+            self._contribute(sensor_id, place, -1)
+            place.values = None
+
+    def _contribute(self, sensor_id: str, place: _SensorPlace, sign: int):
+        if place.values is None:
+            return
+        if place.cell is not None:
+            self._apply(self._regions, place.cell, sensor_id, place.values, sign)
+        if place.city:
+            self._apply(self._cities, place.city, sensor_id, place.values, sign)
+
+    @staticmethod
+    def _apply(areas: Dict, key, sensor_id: str, values: Tuple[float, float, int], sign: int):
+        aggregate = areas.get(key)
+        if aggregate is None:
+            aggregate = areas[key] = AreaAggregate()
+        aggregate.apply(sensor_id, values, sign)
+        if not aggregate.sensors:
+            del areas[key]
+
+    @staticmethod
+    def _discard(index: Dict, key, sensor_id: str):
+        members = index.get(key)
+        if members is not None:
+            members.discard(sensor_id)
+            if not members:
+                del index[key]
+
+    def regions(self) -> List[Dict]:
+        result = []
+        for cell, aggregate in sorted(self._regions.items()):
+            latitude, longitude = self.region_center(cell)
+            result.append({"area": self.region_id(cell), "latitude": latitude, "longitude": longitude,
+                           **aggregate.to_dict()})
+        return result
+
+    def region(self, region_id: str) -> Optional[Dict]:
+        try:
+            cell = tuple(int(part) for part in region_id.split(":"))
+        except ValueError:
+            return None
+        aggregate = self._regions.get(cell)
+        if aggregate is None:
+            return None
+        latitude, longitude = self.region_center(cell)
+        return {"area": region_id, "latitude": latitude, "longitude": longitude, **aggregate.to_dict()}
+
+    def cities(self) -> List[Dict]:
+        return [{"area": city, **aggregate.to_dict()} for city, aggregate in sorted(self._cities.items())]
+
+    def city(self, name: str) -> Optional[Dict]:
+        aggregate = self._cities.get(name)
+        return {"area": name, **aggregate.to_dict()} if aggregate else None
+
+    def nearest(self, latitude: float, longitude: float, n: int) -> List[Tuple[float, str]]:
+        """Najbližih n senzora kao (udaljenost_km, sensor_id)"""
+        if not self._cells:
+            return []
+        ci, cj = self.cell_of(latitude, longitude)
+        best: List[Tuple[float, str]] = []  # max-heap preko negativne udaljenosti
+
+        def consider(sensor_ids):
+            for sensor_id in sensor_ids:
+                place = self._places[sensor_id]
+                distance = haversine_km(latitude, longitude, place.latitude, place.longitude)
+                if len(best) < n:
+                    heapq.heappush(best, (-distance, sensor_id))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, sensor_id))
+
+        ring = 0
+        while True:
+            if 8 * ring > len(self._cells):
+                # Prsten ima više ćelija nego što ih je zauzeto - obiđi preostale zauzete izravno
+                for (i, j), sensor_ids in self._cells.items():
+                    if max(abs(i - ci), abs(j - cj)) >= ring:
+                        consider(sensor_ids)
+                break
+            for cell in self._ring(ci, cj, ring):
+                consider(self._cells.get(cell, ()))
+
+            # Sve ćelije u idućim prstenima su barem ring ćelija daleko
+            if len(best) == n and -best[0][0] <= self._ring_min_km(latitude, ring):
+                break
+            ring += 1
+
+        return sorted((-distance, sensor_id) for distance, sensor_id in best)
+
+    def _ring(self, ci: int, cj: int, ring: int):
+        if ring == 0:
+            yield (ci, cj)
+            return
+        for dj in range(-ring, ring + 1):
+            yield (ci - ring, cj + dj)
+            yield (ci + ring, cj + dj)
+        for di in range(-ring + 1, ring):
+            yield (ci + di, cj - ring)
+            yield (ci + di, cj + ring)
+
+    def _ring_min_km(self, latitude: float, ring: int) -> float:
+        """Donja granica udaljenosti do ćelija izvan zadnjeg obiđenog prstena"""
+        # Meridijani se zbližavaju prema polovima, pa se uzima najuži dio
+        widest_lat = min(abs(latitude) + (ring + 1) * self.cell_size, 90.0)
+        return ring * self.cell_size * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+
+    def location(self, sensor_id: str) -> Optional[_SensorPlace]:
+        return self._places.get(sensor_id)
@@ -0,0 +1,160 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional, Tuple
+import time
+
+from models import SensorStats
+
+
+def _epoch(value: datetime) -> float:
+    # Statistika koristi naivne UTC vremenske oznake
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class StatsRecord:
+    """Statistika jednog senzora bez Pydantic objekta - floatovi i epoch sekunde"""
+
+    __slots__ = (
+        "sensor_id", "period_start", "period_end", "data_points",
+        "temperature_min", "temperature_max", "temperature_avg", "temperature_std",
+        "aqi_min", "aqi_max", "aqi_avg", "aqi_std", "temperature_slope",
+        "anomalies", "anomaly_count", "last_updated"
+    )
+
+    def __init__(self, stats: SensorStats):
+        self.sensor_id = stats.sensor_id
+        self.period_start = _epoch(stats.period_start)
+        self.period_end = _epoch(stats.period_end)
+        self.data_points = stats.data_points
+        self.temperature_min = stats.temperature_min
+        self.temperature_max = stats.temperature_max
+        self.temperature_avg = stats.temperature_avg
+        self.temperature_std = stats.temperature_std
+        self.aqi_min = stats.aqi_min
+        self.aqi_max = stats.aqi_max
+        self.aqi_avg = stats.aqi_avg
+        self.aqi_std = stats.aqi_std
+        self.temperature_slope = stats.temperature_slope
+        self.anomalies = tuple(stats.anomalies)
+        self.anomaly_count = stats.anomaly_count
+        self.last_updated = _epoch(stats.last_updated)
+
+    def to_stats(self) -> SensorStats:
+        """Pydantic model za odgovor; polja su već validirana pri spremanju"""
+        return SensorStats.model_construct(
+            sensor_id=self.sensor_id,
+            period_start=datetime.utcfromtimestamp(self.period_start),
+            period_end=datetime.utcfromtimestamp(self.period_end),
+            data_points=self.data_points,
+            temperature_min=self.temperature_min,
+            temperature_max=self.temperature_max,
+            temperature_avg=self.temperature_avg,
+            temperature_std=self.temperature_std,
+            aqi_min=self.aqi_min,
+            aqi_max=self.aqi_max,
+            aqi_avg=self.aqi_avg,
+            aqi_std=self.aqi_std,
+            temperature_slope=self.temperature_slope,
+            window=None,
+            anomalies=list(self.anomalies),
+            anomaly_count=self.anomaly_count,
+            last_updated=datetime.utcfromtimestamp(self.last_updated)
+        )
+
+
+class StatsStore:
+    """Ograničeni cache statistika po senzoru s LRU/TTL izbacivanjem.
+
+    Poredak je po zadnjoj promjeni podataka: senzor koji ne šalje nova
+    očitanja pada na početak i prvi se izbacuje kad se prijeđe capacity.
+    Senzor čije je zadnje očitanje starije od ttl sekundi je neaktivan i
+    izbacuje se pri expire(). Usporedo se drži sortirana lista id-eva za
+    stabilnu paginaciju. capacity ili ttl 0 isključuje pripadno ograničenje.
+    """
+
+    def __init__(self, capacity: int = 100000, ttl: float = 86400, on_evict: Optional[Callable[[str], None]] = None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.evicted = 0
+        self._records: "OrderedDict[str, StatsRecord]" = OrderedDict()
+        self._sorted_ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self._records
+
+    def is_active(self, period_end: float, now: Optional[float] = None) -> bool:
+        """Je li zadnje očitanje (epoch) unutar ttl"""
+        return not self.ttl or (now or time.time()) - period_end <= self.ttl
+
+    def get(self, sensor_id: str) -> Optional[SensorStats]:
+        record = self._records.get(sensor_id)
+        return record.to_stats() if record else None
+
+    def put(self, stats: SensorStats) -> Optional[bool]:
+        """Spremi statistiku.
+
+        Vraća None ako je senzor neaktivan (nije spremljena, a stari zapis
+        se izbacuje), True za novi senzor ili nova očitanja, False ako se
+        podaci nisu promijenili.
+        """
+        record = StatsRecord(stats)
+        if not self.is_active(record.period_end):
+            if stats.sensor_id in self._records:
+                self._evict(stats.sensor_id)
+            return None
+
+        previous = self._records.get(stats.sensor_id)
+        self._records[stats.sensor_id] = record
+        # Ista očitanja (npr. ponovno čitanje iz storagea) ne osvježavaju LRU poredak
+        changed = True
+        if previous is None:
+            insort(self._sorted_ids, stats.sensor_id)
+        elif previous.period_end != record.period_end or previous.data_points != record.data_points:
+            self._records.move_to_end(stats.sensor_id)
+        else:
+            changed = False
+
+        while self.capacity and len(self._records) > self.capacity:
+            self._evict(next(iter(self._records)))
+        return changed
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """Izbaci senzore bez očitanja u zadnjih ttl sekundi"""
+        if not self.ttl:
+            return []
+        now = now or time.time()
+        expired = [sensor_id for sensor_id, record in self._records.items() if now - record.period_end > self.ttl]
+        for sensor_id in expired:
+            self._evict(sensor_id)
+        return expired
+
+    def _evict(self, sensor_id: str):
+        del self._records[sensor_id]
+        index = bisect_left(self._sorted_ids, sensor_id)
+        del self._sorted_ids[index]
+        self.evicted += 1
+        if self.on_evict:
+            self.on_evict(sensor_id)
+
+    def records(self) -> Iterator[StatsRecord]:
+        """Zapisi sortirani po sensor_id"""
+        records = self._records
+        return (records[sensor_id] for sensor_id in self._sorted_ids)
+
+    def page(
+        self,
+        offset: int = 0,
+        limit: int = 100,
+        predicate: Optional[Callable[[StatsRecord], bool]] = None
+    ) -> Tuple[int, List[StatsRecord]]:
+        """Stranica zapisa sortiranih po sensor_id; vraća (ukupno, zapisi)"""
+        if predicate is None:
+            ids = self._sorted_ids[offset:offset + limit]
+            return len(self._sorted_ids), [self._records[sensor_id] for sensor_id in ids]
+        matches = [record for record in self.records() if predicate(record)]
+        return len(matches), matches[offset:offset + limit]
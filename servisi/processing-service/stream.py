@@ -0,0 +1,105 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class Subscriber:
+    """Jedan live klijent (WebSocket ili SSE) s vlastitim međuspremnikom.
+
+    Čekajuće poruke drže se po senzoru, pa nova statistika zamjenjuje
+    staru koju spori klijent još nije preuzeo. Međuspremnik je ograničen
+    na max_pending senzora, a višak odbacuje najstariju poruku.
+    """
+
+    __slots__ = ("sensor_ids", "max_pending", "pending", "dropped", "closed", "_event")
+
+    def __init__(self, sensor_ids: Optional[Set[str]], max_pending: int):
+        self.sensor_ids = sensor_ids
+        self.max_pending = max_pending
+        self.pending: Dict[str, bytes] = {}
+        self.dropped = 0
+        self.closed = False
+        self._event = asyncio.Event()
+
+    def offer(self, sensor_id: str, payload: bytes):
+        """Dodaj poruku u međuspremnik (coalescing po senzoru)"""
+        if self.pending.pop(sensor_id, None) is None and len(self.pending) >= self.max_pending:
+            del self.pending[next(iter(self.pending))]
+            self.dropped += 1
+        self.pending[sensor_id] = payload
+        self._event.set()
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+    async def next_batch(self, timeout: float) -> List[bytes]:
+        """Pričekaj nove poruke; prazna lista znači keepalive"""
+        if not self.pending and not self.closed:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._event.clear()
+        batch = list(self.pending.values())
+        self.pending = {}
+        return batch
+
+
+class StatsBroadcaster:
+    """Fan-out statistika prema svim pretplatnicima.
+
+    Pretplatnici su indeksirani po senzoru, pa jedna objava dotiče samo
+    klijente koje taj senzor zanima, a payload se serijalizira jednom.
+    """
+
+    def __init__(self, max_pending: int = 1000):
+        self.max_pending = max_pending
+        self.published = 0
+        self.subscribers = 0
+        self._all: Set[Subscriber] = set()
+        self._by_sensor: Dict[str, Set[Subscriber]] = {}
+
+    def subscribe(self, sensor_ids: Optional[Iterable[str]] = None) -> Subscriber:
+        subscriber = Subscriber(None, self.max_pending)
+        self._index(subscriber, sensor_ids)
+        self.subscribers += 1
+        return subscriber
+
+    def update_filter(self, subscriber: Subscriber, sensor_ids: Optional[Iterable[str]]):
+        """Promijeni filter senzora postojećem pretplatniku"""
+        self._unindex(subscriber)
+        self._index(subscriber, sensor_ids)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber.closed:
+            return
+        self._unindex(subscriber)
+        self.subscribers -= 1
+        subscriber.close()
+
+    def publish(self, sensor_id: str, payload: bytes):
+        """Proslijedi novu statistiku senzora zainteresiranim klijentima"""
+        self.published += 1
+        for subscriber in self._all:
+            subscriber.offer(sensor_id, payload)
+        for subscriber in self._by_sensor.get(sensor_id, ()):
+            subscriber.offer(sensor_id, payload)
+
+    def _index(self, subscriber: Subscriber, sensor_ids: Optional[Iterable[str]]):
+        subscriber.sensor_ids = set(sensor_ids) if sensor_ids else None
+        if subscriber.sensor_ids is None:
+            self._all.add(subscriber)
+            return
+        for sensor_id in subscriber.sensor_ids:
+            self._by_sensor.setdefault(sensor_id, set()).add(subscriber)
+
+    def _unindex(self, subscriber: Subscriber):
+        if subscriber.sensor_ids is None:
+            self._all.discard(subscriber)
+            return
+        for sensor_id in subscriber.sensor_ids:
+            subscribers = self._by_sensor.get(sensor_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_sensor[sensor_id]
@@ -0,0 +1,228 @@
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Optional, Tuple
+import math
+
+# Podržani prozori (oznaka -> trajanje u sekundama)
+WINDOWS: Dict[str, int] = {
+    "1m": 60,
+    "15m": 15 * 60,
+    "1h": 60 * 60,
+    "24h": 24 * 60 * 60,
+}
+
+# Svaki prozor dijeli se na fiksni broj bucketa, pa memorija po senzoru
+# ne ovisi o frekvenciji očitanja
+BUCKETS_PER_WINDOW = 60
+
+
+def to_epoch(value) -> Optional[float]:
+    """Pretvori timestamp (epoch, ISO string ili datetime) u epoch sekunde"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        # Storage sprema naivne UTC vremenske oznake
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class _Moments:
+    """Zbrojevi iz kojih se u O(1) računaju prosjek, std i nagib regresije"""
+
+    __slots__ = ("n", "x_sum", "xx_sum", "xy_sum", "temp_sum", "temp_sq", "aqi_sum", "aqi_sq")
+
+    def __init__(self):
+        self.n = 0
+        self.x_sum = self.xx_sum = self.xy_sum = 0.0
+        self.temp_sum = self.temp_sq = 0.0
+        self.aqi_sum = self.aqi_sq = 0.0
+
+    def add(self, x: float, temperature: float, aqi: float):
+        self.n += 1
+        self.x_sum += x
+        self.xx_sum += x * x
+        self.xy_sum += x * temperature
+        self.temp_sum += temperature
+        self.temp_sq += temperature * temperature
+        self.aqi_sum += aqi
+        self.aqi_sq += aqi * aqi
+
+    def merge(self, other: "_Moments", sign: int):
+        self.n += sign * other.n
+        self.x_sum += sign * other.x_sum
+        self.xx_sum += sign * other.xx_sum
+        self.xy_sum += sign * other.xy_sum
+        self.temp_sum += sign * other.temp_sum
+        self.temp_sq += sign * other.temp_sq
+        self.aqi_sum += sign * other.aqi_sum
+        self.aqi_sq += sign * other.aqi_sq
+
+    def shift(self, offset: float):
+        """Pomakni ishodište x za offset (x -> x - offset)"""
+        self.xx_sum += self.n * offset * offset - 2 * offset * self.x_sum
+        self.xy_sum -= offset * self.temp_sum
+        self.x_sum -= self.n * offset
+
+
+class _Bucket(_Moments):
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        super().__init__()
+        self.index = index
+
+
+def _push_extreme(extremes: Deque[Tuple[int, float]], index: int, value: float, is_min: bool):
+    """Monotoni deque: repni elementi koje nova vrijednost nadmašuje otpadaju"""
+    while extremes and (extremes[-1][1] >= value if is_min else extremes[-1][1] <= value):
+        extremes.pop()
+    # Vrijednost iz istog bucketa koja nije bolja nikad neće postati ekstrem
+    if extremes and extremes[-1][0] == index:
+        return
+    extremes.append((index, value))
+
+
+def _sample_std(total: float, squares: float, n: int) -> Optional[float]:
+    if n < 2:
+        return None
+    variance = (squares - total * total / n) / (n - 1)
+    return math.sqrt(max(variance, 0.0))
+
+
+class TimeWindow:
+    """Klizni vremenski prozor nad bucketima.
+
+    Dodavanje je amortizirano O(1): novo očitanje ulazi u zadnji bucket i
+    u zbrojeve prozora, a istekli bucketi se oduzimaju. Min/max se drže u
+    monotonim dequeovima, a nagib temperature iz zbrojeva linearne regresije.
+    Granica prozora je točna do širine jednog bucketa.
+
+    x regresije mjeri se od početka najstarijeg živog bucketa (x_origin):
+    kad bucketi isteknu, ishodište se pomiče, a zbrojevi prozora ponovno
+    zbrajaju iz bucketa, pa greška zaokruživanja ne raste s trajanjem rada.
+    """
+
+    __slots__ = ("duration", "width", "origin", "x_origin", "buckets", "totals", "last_ts",
+                 "temp_min", "temp_max", "aqi_min", "aqi_max")
+
+    def __init__(self, duration: int, buckets: int = BUCKETS_PER_WINDOW):
+        self.duration = duration
+        self.width = duration / buckets
+        self.origin: Optional[float] = None
+        self.x_origin: Optional[float] = None
+        self.buckets: Deque[_Bucket] = deque()
+        self.totals = _Moments()
+        self.last_ts: Optional[float] = None
+        self.temp_min: Deque[Tuple[int, float]] = deque()
+        self.temp_max: Deque[Tuple[int, float]] = deque()
+        self.aqi_min: Deque[Tuple[int, float]] = deque()
+        self.aqi_max: Deque[Tuple[int, float]] = deque()
+
+    def add(self, ts: float, temperature: float, aqi: float):
+        if self.origin is None:
+            self.origin = self.x_origin = ts
+        index = int((ts - self.origin) // self.width)
+        if not self.buckets or self.buckets[-1].index != index:
+            self.buckets.append(_Bucket(index))
+
+        # Regresija se računa u satima od najstarijeg bucketa (mali brojevi)
+        x = (ts - self.x_origin) / 3600
+        self.buckets[-1].add(x, temperature, aqi)
+        self.totals.add(x, temperature, aqi)
+        _push_extreme(self.temp_min, index, temperature, True)
+        _push_extreme(self.temp_max, index, temperature, False)
+        _push_extreme(self.aqi_min, index, aqi, True)
+        _push_extreme(self.aqi_max, index, aqi, False)
+        self.last_ts = ts
+        self.expire(ts)
+
+    def expire(self, now: float):
+        """Izbaci buckete koji su u potpunosti izvan prozora"""
+        if self.origin is None:
+            return
+        cutoff = math.floor((now - self.duration - self.origin) / self.width) - 1
+        if not self.buckets or self.buckets[0].index > cutoff:
+            return
+        while self.buckets and self.buckets[0].index <= cutoff:
+            self.buckets.popleft()
+        for extremes in (self.temp_min, self.temp_max, self.aqi_min, self.aqi_max):
+            while extremes and extremes[0][0] <= cutoff:
+                extremes.popleft()
+        if not self.buckets:
+            # Prazan prozor - kreni iznova
+            self.totals = _Moments()
+            self.origin = self.x_origin = None
+            return
+
+        # Ishodište x na najstariji živi bucket, zbrojevi iznova iz bucketa
+        x_origin = self.origin + self.buckets[0].index * self.width
+        offset = (x_origin - self.x_origin) / 3600
+        self.x_origin = x_origin
+        totals = _Moments()
+        for bucket in self.buckets:
+            bucket.shift(offset)
+            totals.merge(bucket, 1)
+        self.totals = totals
+
+    @property
+    def count(self) -> int:
+        return self.totals.n
+
+    def temperature_slope(self) -> Optional[float]:
+        """Nagib temperature u °C po satu (linearna regresija)"""
+        t = self.totals
+        denominator = t.n * t.xx_sum - t.x_sum * t.x_sum
+        if t.n < 2 or denominator <= 1e-12:
+            return None
+        return (t.n * t.xy_sum - t.x_sum * t.temp_sum) / denominator
+
+    def snapshot(self) -> Optional[Dict]:
+        """Trenutne vrijednosti prozora ili None ako je prazan"""
+        t = self.totals
+        if t.n == 0:
+            return None
+        slope = self.temperature_slope()
+        temp_std = _sample_std(t.temp_sum, t.temp_sq, t.n)
+        aqi_std = _sample_std(t.aqi_sum, t.aqi_sq, t.n)
+        return {
+            "period_start": datetime.utcfromtimestamp(self.origin + self.buckets[0].index * self.width),
+            "period_end": datetime.utcfromtimestamp(self.last_ts),
+            "data_points": t.n,
+            "temperature_min": self.temp_min[0][1],
+            "temperature_max": self.temp_max[0][1],
+            "temperature_avg": round(t.temp_sum / t.n, 2),
+            "temperature_std": round(temp_std, 2) if temp_std is not None else None,
+            "aqi_min": self.aqi_min[0][1],
+            "aqi_max": self.aqi_max[0][1],
+            "aqi_avg": round(t.aqi_sum / t.n, 2),
+            "aqi_std": round(aqi_std, 2) if aqi_std is not None else None,
+            "temperature_slope": round(slope, 3) if slope is not None else None,
+        }
+
+
+class SensorWindows:
+    """Svi vremenski prozori jednog senzora"""
+
+    __slots__ = ("windows", "last_ts")
+
+    def __init__(self):
+        self.windows = {label: TimeWindow(duration) for label, duration in WINDOWS.items()}
+        self.last_ts: Optional[float] = None
+
+    def add(self, ts: float, temperature: float, aqi: float) -> bool:
+        """Dodaj očitanje; starija ili već viđena očitanja se preskaču"""
+        if self.last_ts is not None and ts <= self.last_ts:
+            return False
+        self.last_ts = ts
+        for window in self.windows.values():
+            window.add(ts, temperature, aqi)
+        return True
+
+    def get(self, label: str, now: float) -> TimeWindow:
+        window = self.windows[label]
+        window.expire(now)
+        return window
@@ -0,0 +1,47 @@
+"""Stupčani format očitanja između storagea i processinga.
+
+JSON:   {"ids": [...], "temps": [...], "aqis": [...], "ts": [...]}, ts je epoch (UTC)
+Binary: četiri little-endian niza iste duljine jedan za drugim -
+        ids (int64), temps, aqis, ts (float64); 32 bajta po očitanju
+
+Format se bira Accept headerom; bez njega /data vraća redove kao i prije.
+"""
+import sys
+from array import array
+from typing import Optional, Sequence
+
+COLUMNAR_JSON = "application/vnd.sensor-columns+json"
+COLUMNAR_BINARY = "application/vnd.sensor-columns+f64le"
+
+COLUMN_NAMES = ("ids", "temps", "aqis", "ts")
+BYTES_PER_ROW = 32
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """Stupčani media type s najvećim q u Accept headeru ili None za redove"""
+    if not accept:
+        return None
+    best, best_q = None, 0.0
+    for part in accept.split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type in (COLUMNAR_JSON, COLUMNAR_BINARY) and q > best_q:
+            best, best_q = media_type, q
+        elif media_type in ("application/json", "*/*", "application/*") and q > best_q:
+            best, best_q = None, q
+    return best
+
+
+def encode_binary(ids: Sequence[int], temps: Sequence[float], aqis: Sequence[float], ts: Sequence[float]) -> bytes:
+    """Stupci u binarni format bez prolaska kroz JSON"""
+    parts = [array("q", ids), array("d", temps), array("d", aqis), array("d", ts)]
+    if sys.byteorder == "big":
+        for part in parts:
+            part.byteswap()
+    return b"".join(part.tobytes() for part in parts)
@@ -0,0 +1,55 @@
+import json
+import os
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Iste opcije kao FastAPI-jev ORJSONResponse
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY if orjson else 0
+
+# Opt-in: FAST_JSON=1 uključuje orjson za odgovore i HTTP klijente
+FAST_JSON = os.getenv("FAST_JSON", "0").lower() in ("1", "true", "yes")
+
+if FAST_JSON and orjson is None:
+    print("FAST_JSON je uključen, ali orjson nije instaliran - koristi se json")
+    FAST_JSON = False
+
+
+def loads(data) -> Any:
+    """Parsiraj JSON (str ili bytes)"""
+    if FAST_JSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_serialize(obj: Any) -> str:
+    """Serializer za aiohttp ClientSession(json_serialize=...)"""
+    if FAST_JSON:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serijaliziraj u kompaktni UTF-8 JSON, isto kao response_class()"""
+    if FAST_JSON:
+        return orjson.dumps(obj, option=ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON odgovor serijaliziran orjsonom (FastAPI-jev ORJSONResponse je zastario)"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def response_class():
+    """Default response klasa za FastAPI aplikaciju"""
+    if FAST_JSON:
+        return FastJSONResponse
+    return JSONResponse
@@ -0,0 +1,78 @@
+"""Readiness (spreman za promet) odvojeno od liveness (/health) i mjerenje hladnog starta."""
+import asyncio
+import os
+import random
+import time
+from typing import Dict, Optional
+
+
+def _process_start() -> float:
+    """Početak procesa kao epoch; na Linuxu iz /proc, inače vrijeme importa"""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        # Polje 22 (starttime) u otkucajima od boota; fields počinje od polja 3
+        return time.time() - uptime + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_STARTED = _process_start()
+
+
+class Readiness:
+    """Stanje spremnosti servisa i trajanje od starta procesa do spremnosti"""
+
+    def __init__(self, service: str):
+        self.service = service
+        self.ready = False
+        self.startup_seconds: Optional[float] = None
+        self.checks: Dict[str, bool] = {}
+
+    def mark_ready(self):
+        if self.ready:
+            return
+        self.ready = True
+        self.startup_seconds = round(time.time() - PROCESS_STARTED, 3)
+        print(f"{self.service} spreman za {self.startup_seconds}s od starta procesa (pid {os.getpid()})")
+
+    def to_dict(self) -> Dict:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "service": self.service,
+            "checks": self.checks,
+            "startup_seconds": self.startup_seconds,
+            "pid": os.getpid(),
+        }
+
+
+async def wait_for_service(
+    session,
+    url: str,
+    name: str,
+    initial_delay: float = 0.5,
+    max_delay: float = 5.0,
+    timeout: Optional[float] = None
+) -> bool:
+    """Čekaj da url vrati 200, s eksponencijalnim backoffom i jitterom.
+
+    Vraća False ako servis nije spreman unutar timeout sekundi (None - čeka se zauvijek).
+    """
+    import aiohttp
+
+    delay = initial_delay
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                if resp.status == 200:
+                    return True
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        if deadline and time.monotonic() + delay > deadline:
+            return False
+        print(f"Čekam {name} ({url}), novi pokušaj za {delay:.1f}s")
+        await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(delay * 2, max_delay)
@@ -0,0 +1,45 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional
+
+# Jedinstveni raspon vrijednosti za cijeli sustav (collector i storage)
+TEMPERATURE_MIN = -20.0
+TEMPERATURE_MAX = 50.0
+AQI_MIN = 0.0
+AQI_MAX = 300.0
+
+# Očitanje ne smije biti iz budućnosti ni starije od 24h
+MAX_READING_AGE = 24 * 60 * 60
+
+# Raspon koji datetime.utcfromtimestamp može pretvoriti (1970 - 9999)
+TIMESTAMP_MIN = 0.0
+TIMESTAMP_MAX = 253402300799.0
+
+
+class SensorReading(BaseModel):
+    """Očitanje senzora - ista pravila validacije u svim servisima.
+
+    Sva ograničenja su deklarativna (Field), pa ih pydantic-core provjerava
+    bez Python validatora. Timestamp je Unix epoch (UTC) od senzora do
+    storagea.
+    """
+
+    model_config = ConfigDict(extra="ignore")
+
+    sensor_id: str = Field(..., min_length=1, max_length=50, description="ID senzora")
+    temperature: float = Field(..., ge=TEMPERATURE_MIN, le=TEMPERATURE_MAX, description="Temperatura u °C")
+    aqi: float = Field(..., ge=AQI_MIN, le=AQI_MAX, description="Air Quality Index")
+    timestamp: Optional[float] = Field(
+        None, ge=TIMESTAMP_MIN, le=TIMESTAMP_MAX, allow_inf_nan=False, description="Unix timestamp (UTC)"
+    )
+
+
+def is_plausible(reading: SensorReading) -> bool:
+    """Temperatura i AQI oba točno 0 najčešće su greška u očitanju"""
+    return not (reading.temperature == 0 and reading.aqi == 0)
+
+
+def is_fresh(timestamp: Optional[float], now: float) -> bool:
+    """Timestamp nije iz budućnosti ni stariji od MAX_READING_AGE"""
+    if timestamp is None:
+        return True
+    return now - MAX_READING_AGE <= timestamp <= now
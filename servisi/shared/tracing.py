@@ -0,0 +1,237 @@
+"""Opcionalni tracing i sampling profiler za servise.
+
+TRACE_EXPORT=console ispisuje spanove na stdout, TRACE_EXPORT=file ih
+dodaje u TRACE_FILE (JSON linija po spanu). Polja prate OpenTelemetry
+model (trace_id, span_id, parent_span_id, *_unix_nano, attributes,
+resource), a kontekst se između servisa prenosi W3C traceparent headerom.
+Bez TRACE_EXPORT span() ne radi ništa.
+
+PROFILER_ENABLED=1 dodaje GET /debug/profile?seconds=N koji uzorkuje
+stogove svih threadova i vraća ih u folded formatu (flamegraph.pl,
+speedscope).
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0").lower() in ("1", "true", "yes")
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+TRACING = TRACE_EXPORT in ("console", "file")
+
+_service_name = "unknown"
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_export_lock = threading.Lock()
+_export_file = None
+
+
+class Span:
+    """Jedan span; završava ga span() context manager"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "kind", "start", "attributes", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], kind: str, attributes: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.start = time.time_ns()
+        self.attributes = attributes
+        self.status = "OK"
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self, end: int) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start,
+            "end_time_unix_nano": end,
+            "duration_ms": round((end - self.start) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+            "resource": {"service.name": _service_name},
+        }
+
+
+def _export(record: Dict):
+    global _export_file
+    line = json.dumps(record, default=str)
+    with _export_lock:
+        if TRACE_EXPORT == "console":
+            print(line, flush=True)
+            return
+        if _export_file is None:
+            _export_file = open(TRACE_FILE, "a", buffering=1)
+        _export_file.write(line + "\n")
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id) iz W3C traceparent headera ili None"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+@contextmanager
+def span(name: str, kind: str = "INTERNAL", traceparent: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+    """Izmjeri blok koda kao span, dijete trenutnog spana.
+
+    traceparent (npr. iz dolaznog zahtjeva) postavlja udaljenog roditelja.
+    """
+    if not TRACING:
+        yield None
+        return
+
+    parent = _current.get()
+    remote = parse_traceparent(traceparent) if parent is None else None
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    elif remote is not None:
+        trace_id, parent_id = remote
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+
+    current = Span(name, trace_id, parent_id, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "ERROR"
+        current.attributes["exception.type"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        _export(current.to_dict(time.time_ns()))
+
+
+def inject(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Dodaj traceparent trenutnog spana u headere odlaznog zahtjeva"""
+    headers = dict(headers or {})
+    current = _current.get()
+    if current is not None:
+        headers["traceparent"] = current.traceparent()
+    return headers
+
+
+class TracingMiddleware:
+    """ASGI middleware - server span po HTTP zahtjevu, nastavlja dolazni traceparent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with span(
+            f"{scope['method']} {scope['path']}",
+            kind="SERVER",
+            traceparent=traceparent,
+            **{"http.method": scope["method"], "http.target": scope["path"]}
+        ) as current:
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    current.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
+
+
+def instrument_sqlalchemy(engine):
+    """Span za svaku SQL naredbu (cursor execute)"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        manager = span("sql", kind="CLIENT", **{"db.system": engine.dialect.name, "db.statement": statement})
+        manager.__enter__()
+        context._trace_span = manager
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        manager = getattr(context, "_trace_span", None)
+        if manager is not None:
+            context._trace_span = None
+            manager.__exit__(None, None, None)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        manager = getattr(context, "_trace_span", None) if context is not None else None
+        if manager is not None:
+            context._trace_span = None
+            error = exception_context.original_exception
+            manager.__exit__(type(error), error, error.__traceback__)
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """Uzorkuj stogove svih ostalih threadova i vrati ih u folded formatu"""
+    own = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def setup(app, service_name: str, engine=None):
+    """Uključi tracing i profiler na FastAPI aplikaciji prema konfiguraciji"""
+    global _service_name
+    _service_name = service_name
+
+    if TRACING:
+        app.add_middleware(TracingMiddleware)
+        if engine is not None:
+            instrument_sqlalchemy(engine)
+        print(f"Tracing: {TRACE_EXPORT}" + (f" ({TRACE_FILE})" if TRACE_EXPORT == "file" else ""))
+
+    if PROFILER_ENABLED:
+        import anyio
+        from fastapi import Query
+        from fastapi.responses import PlainTextResponse
+
+        @app.get("/debug/profile", response_class=PlainTextResponse, include_in_schema=False)
+        async def profile(seconds: float = Query(5, gt=0, le=PROFILER_MAX_SECONDS)):
+            """Sampling profil svih threadova kroz N sekundi (folded stacks za flamegraph)"""
+            # Uzorkovanje ide u zasebnom threadu, pa event loop radi normalno i ulazi u profil
+            return await anyio.to_thread.run_sync(sample_stacks, seconds)
@@ -1,6 +1,7 @@
 import aiohttp
 import random
 import math
+import time
 from datetime import datetime
 from typing import List, Dict, Optional
 from models import Location, SensorConfig
@@ -104,7 +105,7 @@ class DataGenerator:
             'sensor_id': sensor.sensor_id,
             'temperature': temp,
             'aqi': aqi,
-            'timestamp': datetime.utcnow().timestamp()
+            'timestamp': time.time()
         }
 
 class SensorRegistrar:
@@ -120,7 +121,9 @@ class SensorRegistrar:
         payload = {
             'id': sensor.sensor_id,
             'name': sensor.name,
-            'location': sensor.location.city
+            'location': sensor.location.city,
+            'latitude': sensor.location.latitude,
+            'longitude': sensor.location.longitude
         }
         
         try:
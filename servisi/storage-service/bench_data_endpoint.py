@@ -0,0 +1,82 @@
+"""Benchmark GET /data?limit=N s uključenim i isključenim FAST_JSON.
+
+Svaki način radi u zasebnom procesu (FAST_JSON se čita pri importu)
+nad istom privremenom bazom s N očitanja.
+
+Pokretanje iz direktorija servisa:
+    PYTHONPATH=.. python bench_data_endpoint.py [broj_očitanja] [ponavljanja]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def seed(count: int):
+    from database import SessionLocal, engine, Base
+    from models import Sensor, SensorData
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(Sensor(id="BENCH-001", name="Bench", location="Zagreb", latitude=45.81, longitude=15.98))
+    start = datetime.utcnow() - timedelta(seconds=count)
+    db.bulk_save_objects([
+        SensorData(
+            sensor_id="BENCH-001",
+            temperature=10 + (i % 200) / 10,
+            aqi=20 + (i % 100),
+            timestamp=start + timedelta(seconds=i)
+        )
+        for i in range(count)
+    ])
+    db.commit()
+    db.close()
+
+
+def run(count: int, repeats: int):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = TestClient(app)
+    client.get(f"/data?limit={count}")  # zagrijavanje
+
+    began = time.perf_counter()
+    for _ in range(repeats):
+        response = client.get(f"/data?limit={count}")
+        assert response.status_code == 200 and len(response.json()) == count
+    elapsed = (time.perf_counter() - began) / repeats
+    print(f"{elapsed * 1000:.1f}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ("--seed", "--run"):
+        count, repeats = int(sys.argv[2]), int(sys.argv[3])
+        seed(count) if sys.argv[1] == "--seed" else run(count, repeats)
+        return
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cache upita bi sve mjerene zahtjeve poslužio iz memorije - mjeri se serijalizacija
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp}/bench.db", "QUERY_CACHE_SIZE": "0"}
+        subprocess.run([sys.executable, __file__, "--seed", str(count), "0"], env=env, check=True)
+
+        results = {}
+        for mode in ("0", "1"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--run", str(count), str(repeats)],
+                env={**env, "FAST_JSON": mode}, check=True, capture_output=True, text=True
+            )
+            results[mode] = float(out.stdout.strip().splitlines()[-1])
+
+    print(f"GET /data?limit={count}, {repeats} ponavljanja")
+    print(f"Before (FAST_JSON=0): {results['0']:.1f} ms/request")
+    print(f"After  (FAST_JSON=1): {results['1']:.1f} ms/request")
+    print(f"Speedup:              {results['0'] / results['1']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
+import fcntl
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -12,6 +14,15 @@ if "sqlite" in DATABASE_URL:
         DATABASE_URL,
         connect_args={"check_same_thread": False}
     )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL - čitanja ne čekaju upis; busy_timeout - workeri čekaju writer lock umjesto greške"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
 else:
     engine = create_engine(DATABASE_URL)
 
@@ -20,6 +31,59 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def add_missing_columns():
+    """
+    create_all ne mijenja postojeće tablice, pa se nove nullable kolone
+    dodaju ručno (ALTER TABLE ... ADD COLUMN) na postojećim bazama
+
+    """
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"Dodana kolona {table.name}.{column.name}")
+
+
+def add_missing_indexes():
+    """
+    Indeksi definirani u modelima, a kojih nema na postojećoj bazi.
+    Unique indeks ne može se kreirati ako baza već ima duplikate
+
+    """
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except IntegrityError as e:
+                print(f"Indeks {index.name} nije kreiran - postoje duplikati: {e.orig}")
+
+
+def init_db():
+    """
+    Kreiranje tablica i migracije. S više uvicorn workera svaki ga
+    pokreće pri startu, pa se serijaliziraju file lockom
+
+    """
+
+    lock_path = os.getenv("DB_INIT_LOCK", "/tmp/storage-db-init.lock")
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            Base.metadata.create_all(bind=engine)
+            add_missing_columns()
+            add_missing_indexes()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 def get_db():
     """
     Dependency koji osigurava da svaki request dobije svoju DB sesiju
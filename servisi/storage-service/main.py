@@ -1,31 +1,145 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, or_, text
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from pydantic import TypeAdapter
 from typing import List, Optional
-from datetime import datetime
-from database import engine, get_db
-from models import Base, Sensor, SensorData
+from datetime import datetime, timezone, date
+import os
+import time
+from database import engine, get_db, init_db
+from models import Sensor, SensorData
 from schemas import (
     SensorCreate,SensorResponse,
     SensorDataResponse, SensorDataCreate
 )
+from shared.fastjson import FAST_JSON, dumps, response_class
+from shared.columnar import COLUMNAR_JSON, COLUMNAR_BINARY, negotiate, encode_binary
+from shared import tracing
+from shards import ArchivedShardError, ShardRouter
+from shared.readiness import Readiness
+from shared.readings import MAX_READING_AGE
+from query_cache import COUNTER_NAMES, QueryCache
+from worker_state import TagGenerations, WorkerCounters, state_path
 
 app = FastAPI(
     title="Storage Service", 
     description="Servis za spremanje podataka o senzorima", 
-    version="1.0.1")
+    version="1.0.1",
+    default_response_class=response_class())
+tracing.setup(app, "storage", engine)
+
+# Kolone za brze liste - bez ORM objekata i response_model validacije
+SENSOR_COLUMNS = (Sensor.id, Sensor.name, Sensor.location, Sensor.latitude, Sensor.longitude, Sensor.created_at)
+SENSOR_DATA_COLUMNS = (SensorData.id, SensorData.sensor_id, SensorData.temperature, SensorData.aqi, SensorData.timestamp)
+DATA_FIELDS = ("id", "sensor_id", "temperature", "aqi", "timestamp")
+EPOCH = datetime(1970, 1, 1)
+
+# Particioniranje očitanja u više SQLite datoteka (opcionalno): "day" ili "sensor"
+SHARD_MODE = os.getenv("SHARD_MODE", "").lower()
+SHARD_DIR = os.getenv("SHARD_DIR", "./data/shards")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "4"))
+# Shardovi i arhiviranje vode se u memoriji procesa - sharding radi samo s jednim workerom
+if SHARD_MODE and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    raise RuntimeError("SHARD_MODE zahtijeva WEB_CONCURRENCY=1 (shardovi se ne dijele među workerima)")
+shard_router = ShardRouter(SHARD_MODE, SHARD_DIR, SHARD_COUNT) if SHARD_MODE else None
+# Dnevni shard otvara se samo za očitanja iz prozora svježine (uz toleranciju sata)
+SHARD_CLOCK_SKEW = 300
+
+# Brojači ingesta, zbrojeni preko svih workera
+ingest_counters = WorkerCounters(("inserted", "duplicates"), state_path(engine, "ingest.counters"))
+
+readiness = Readiness("storage")
+
+# Cache serijaliziranih odgovora GET /sensors i GET /data; svaki worker ima svoje unose,
+# a invalidacija i brojači su zajednički svim workerima. QUERY_CACHE_SIZE=0 isključuje
+query_cache = QueryCache(
+    max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1000")),
+    max_bytes=int(os.getenv("QUERY_CACHE_MAX_MB", "64")) * 1024 * 1024,
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "5")),
+    generations=TagGenerations(state_path(engine, "cache.generations")),
+    counters=WorkerCounters(COUNTER_NAMES, state_path(engine, "cache.counters"))
+)
+SENSOR_TAGS = ("sensors",)
+# Nosi ga svaki /data unos - arhiviranje shardova poništava sva očitanja
+DATA_ALL_TAG = "data:*"
+SENSOR_LIST = TypeAdapter(List[SensorResponse])
+SENSOR_DATA_LIST = TypeAdapter(List[SensorDataResponse])
+
+
+def cached_response(body: bytes, media_type: str, cache_status: str) -> Response:
+    return Response(content=body, media_type=media_type, headers={"X-Cache": cache_status})
+
 
 @app.on_event("startup")
 def on_startup():
     print("Kreiranje tablica...")
-    Base.metadata.create_all(bind=engine)
+    init_db()
     print("Tablice kreirane")    
+    if shard_router:
+        print(f"Sharding: {SHARD_MODE}, {len(shard_router.shards_for_read())} shardova u {SHARD_DIR}")
+    
+    # Zagrijavanje - otvori konekcije ovog workera i učitaj indekse u page cache
+    with engine.connect() as conn:
+        conn.execute(text("SELECT count(*) FROM sensors"))
+    readiness.checks["database"] = True
+    if shard_router:
+        # Očitanja spremljena prije uključivanja shardinga prebacuju se u shardove
+        moved, kept = shard_router.migrate_from(engine)
+        if moved or kept:
+            print(f"Migracija u shardove: premješteno {moved}, ostavljeno {kept} (arhivirani dani)")
+        for shard in shard_router.shards_for_read():
+            with shard.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        readiness.checks["shards"] = True
+    readiness.mark_ready()
 
 
 @app.get("/health")
 def health():
+    """Liveness - proces radi"""
     return {"status" : "ok"}
 
 
+@app.get("/ready")
+def ready():
+    """Readiness - baza je inicijalizirana i worker prima promet"""
+    return JSONResponse(readiness.to_dict(), status_code=200 if readiness.ready else 503)
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "ingest": {**ingest_counters.totals(), "workers": ingest_counters.per_worker()},
+        "query_cache": query_cache.get_stats()
+    }
+
+
+@app.get("/shards")
+def list_shards():
+    """Shardovi očitanja i njihove veličine"""
+    if not shard_router:
+        raise HTTPException(status_code=404, detail="Sharding nije uključen (SHARD_MODE)")
+    return shard_router.get_stats()
+
+
+@app.post("/shards/archive")
+def archive_shards(before: date = Query(..., description="Arhiviraj dnevne shardove starije od ovog datuma")):
+    """Premjesti stare dnevne shardove u arhivu (bez DELETE upita)"""
+    if not shard_router:
+        raise HTTPException(status_code=404, detail="Sharding nije uključen (SHARD_MODE)")
+    try:
+        archived = shard_router.archive(before)
+    except FileExistsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if archived:
+        query_cache.invalidate(DATA_ALL_TAG)
+    return {"archived": archived}
+
+
 @app.post("/sensors", response_model=SensorResponse)
 def create_sensor(
      sensor: SensorCreate, 
@@ -40,17 +154,55 @@ def create_sensor(
     db.add(db_sensor)
     db.commit()
     db.refresh(db_sensor)
+    query_cache.invalidate(*SENSOR_TAGS)
     return db_sensor
 
 
 @app.get("/sensors", response_model=List[SensorResponse])
 def list_sensors(
     skip: int = 0, 
-    limit: int = 100, 
+    limit: int = Query(100, ge=1, le=10000),
+    since: Optional[datetime] = Query(None, description="Samo senzori kreirani nakon (created_at) - watermark"),
+    after: Optional[str] = Query(None, description="Id zadnjeg senzora s created_at == since (keyset)"),
     db: Session = Depends(get_db)
 ):
-    sensors = db.query(Sensor).offset(skip).limit(limit).all()
-    return sensors
+    """Senzori poredani po (created_at, id).
+
+    Za listanje po stranicama i inkrementalnu sinkronizaciju klijent šalje
+    created_at i id zadnjeg primljenog senzora kao since/after, pa upit
+    ide po indeksu bez skip-a.
+    """
+    if since is not None and since.tzinfo is not None:
+        # created_at se sprema kao naivni UTC
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    key = ("sensors", skip, limit, since, after if since is not None else None)
+    entry = query_cache.get(key)
+    if entry:
+        return cached_response(entry.body, entry.media_type, "HIT")
+    generation = query_cache.generation(SENSOR_TAGS)
+    
+    query = db.query(Sensor)
+    
+    if since is not None:
+        if after is not None:
+            query = query.filter(or_(
+                Sensor.created_at > since,
+                and_(Sensor.created_at == since, Sensor.id > after)
+            ))
+        else:
+            query = query.filter(Sensor.created_at > since)
+    
+    query = query.order_by(Sensor.created_at, Sensor.id).offset(skip).limit(limit)
+    
+    if FAST_JSON:
+        rows = query.with_entities(*SENSOR_COLUMNS).all()
+        body = dumps([row._asdict() for row in rows])
+    else:
+        body = SENSOR_LIST.dump_json(SENSOR_LIST.validate_python(query.all(), from_attributes=True))
+    
+    query_cache.put(key, body, "application/json", SENSOR_TAGS, generation)
+    return cached_response(body, "application/json", "MISS")
 
 
 @app.get("/sensors/{sensor_id}", response_model=SensorResponse)
@@ -64,6 +216,7 @@ def get_sensor(sensor_id: str, db: Session = Depends(get_db)):
 @app.post("/data", response_model=SensorDataResponse)
 def create_sensor_data(
     data: SensorDataCreate, 
+    response: Response,
     db: Session = Depends(get_db)
 ):
     # Verify sensor exists
@@ -71,44 +224,128 @@ def create_sensor_data(
     if not sensor:
         raise HTTPException(status_code=404, detail="Sensor not found")
     
+    timestamp = datetime.utcfromtimestamp(data.timestamp) if data.timestamp is not None else None
+    
+    if shard_router:
+        if shard_router.mode == "day" and data.timestamp is not None:
+            # Inače bi svaki dan od 1970. do 9999. otvorio svoju datoteku, a budući se ne bi mogao arhivirati
+            now = time.time()
+            if not now - MAX_READING_AGE - SHARD_CLOCK_SKEW <= data.timestamp <= now + SHARD_CLOCK_SKEW:
+                raise HTTPException(status_code=422, detail="Timestamp je izvan prozora svježine za dnevne shardove")
+        # Shard se bira po danu ili senzoru, pa vrijeme mora biti poznato prije upisa
+        try:
+            with tracing.span("shard.insert"):
+                row, duplicate = shard_router.insert(
+                    data.sensor_id, data.temperature, data.aqi, timestamp or datetime.utcnow()
+                )
+        except ArchivedShardError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if duplicate:
+            ingest_counters.incr("duplicates")
+            response.headers["X-Duplicate"] = "1"
+        else:
+            ingest_counters.incr("inserted")
+            query_cache.invalidate(f"data:{data.sensor_id}", "data")
+        return dict(zip(DATA_FIELDS, row))
+    
     # Create data entry
-    db_data = SensorData(**data.dict())
+    db_data = SensorData(
+        sensor_id=data.sensor_id,
+        temperature=data.temperature,
+        aqi=data.aqi,
+        timestamp=timestamp
+    )
     db.add(db_data)
-    db.commit()
-    db.refresh(db_data)
+    try:
+        with tracing.span("db.commit"):
+            db.commit()
+    except IntegrityError:
+        # Isto očitanje je već spremljeno - vrati postojeći zapis (idempotentno)
+        db.rollback()
+        existing = db.query(SensorData).filter(
+            SensorData.sensor_id == data.sensor_id,
+            SensorData.timestamp == db_data.timestamp
+        ).first()
+        if not existing:
+            raise
+        ingest_counters.incr("duplicates")
+        response.headers["X-Duplicate"] = "1"
+        return existing
+    
+    ingest_counters.incr("inserted")
+    query_cache.invalidate(f"data:{data.sensor_id}", "data")
+    with tracing.span("db.refresh"):
+        db.refresh(db_data)
     return db_data
 
 
-@app.get("/data", response_model=List[SensorDataResponse])
+@app.get(
+    "/data",
+    response_model=List[SensorDataResponse],
+    responses={200: {"content": {COLUMNAR_JSON: {}, COLUMNAR_BINARY: {}}}}
+)
 def get_sensor_data(
+    request: Request,
     sensor_id: Optional[str] = Query(None, description="Filter by sensor ID"),
     limit: int = Query(100, description="Maximum number of results"),
     skip: int = Query(0, description="Number of results to skip"),
     db: Session = Depends(get_db)
 ):
+    """Najnovija očitanja; ponovljeni upiti poslužuju se iz cachea do upisa za taj senzor"""
+    columnar = negotiate(request.headers.get("accept"))
+    key = ("data", sensor_id or None, skip, limit, columnar)
+    entry = query_cache.get(key)
+    if entry:
+        return cached_response(entry.body, entry.media_type, "HIT")
+    # Filtrirani upit poništava upis za taj senzor, nefiltrirani svaki upis
+    tags = ((f"data:{sensor_id}",) if sensor_id else ("data",)) + (DATA_ALL_TAG,)
+    generation = query_cache.generation(tags)
     
-    query = db.query(SensorData)
-    
-   
-    if sensor_id:
-        query = query.filter(SensorData.sensor_id == sensor_id)
-    
-   
-    query = query.order_by(SensorData.timestamp.desc())
-    
+    if shard_router:
+        # Čitaju se samo shardovi koje upit dotiče
+        rows = shard_router.query(sensor_id, skip, limit)
+    else:
+        query = db.query(SensorData)
+        
+       
+        if sensor_id:
+            query = query.filter(SensorData.sensor_id == sensor_id)
+        
+       
+        query = query.order_by(SensorData.timestamp.desc()).offset(skip).limit(limit)
+        rows = query.with_entities(*SENSOR_DATA_COLUMNS).all()
     
-    data = query.offset(skip).limit(limit).all()
+    # Stupčani format (Accept header) - bez ključeva po redu i ISO datuma
+    if columnar:
+        ids = [row[0] for row in rows]
+        temps = [row[2] for row in rows]
+        aqis = [row[3] for row in rows]
+        ts = [(row[4] - EPOCH).total_seconds() for row in rows]
+        if columnar == COLUMNAR_BINARY:
+            body = encode_binary(ids, temps, aqis, ts)
+        else:
+            body = dumps({"ids": ids, "temps": temps, "aqis": aqis, "ts": ts})
+        media_type = columnar
+    else:
+        data = [dict(zip(DATA_FIELDS, row)) for row in rows]
+        if FAST_JSON:
+            body = dumps(data)
+        else:
+            body = SENSOR_DATA_LIST.dump_json(SENSOR_DATA_LIST.validate_python(data))
+        media_type = "application/json"
     
-    return data
+    query_cache.put(key, body, media_type, tags, generation)
+    return cached_response(body, media_type, "MISS")
 
 
 if __name__ == "__main__":
     import uvicorn
+    # Broj workera iz WEB_CONCURRENCY; svaki worker ima svoj engine i pool konekcija
     uvicorn.run(
-        app, 
+        "main:app", 
         host="0.0.0.0", 
         port=8001,
-        reload=True
+        workers=int(os.getenv("WEB_CONCURRENCY", "1" if SHARD_MODE else "2"))
     )
 
     
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column,String, Float, DateTime, Integer
+from sqlalchemy import Column,String, Float, DateTime, Integer, Index
 from datetime import datetime
 from database import Base 
 
@@ -6,15 +6,25 @@ from database import Base
 
 class Sensor(Base):
     __tablename__="sensors"
+    __table_args__ = (
+        # Keyset paginacija i inkrementalna sinkronizacija po (created_at, id)
+        Index("ix_sensors_created_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key = True, index = True)
     name = Column(String, nullable=False)
     location = Column(String)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
     created_at = Column(DateTime, default = datetime.utcnow)
 
 
 class SensorData(Base):
     __tablename__="sensor_data"
+    __table_args__ = (
+        # Isto očitanje (senzor + vrijeme) smije postojati samo jednom
+        Index("uq_sensor_data_sensor_ts", "sensor_id", "timestamp", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     sensor_id = Column(String, index=True, nullable=False)
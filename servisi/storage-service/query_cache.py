@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+from worker_state import TagGenerations, WorkerCounters
+
+COUNTER_NAMES = ("hits", "misses", "evictions", "invalidations", "stale_puts", "entries", "bytes")
+
+
+class CachedBody:
+    """Serijalizirani odgovor spreman za slanje"""
+
+    __slots__ = ("body", "media_type", "tags", "generation", "expires")
+
+    def __init__(self, body: bytes, media_type: str, tags: Tuple[str, ...], generation: Tuple[int, ...], expires: float):
+        self.body = body
+        self.media_type = media_type
+        self.tags = tags
+        self.generation = generation
+        self.expires = expires
+
+
+class QueryCache:
+    """LRU cache rezultata upita, po normaliziranim parametrima.
+
+    Svaki unos nosi tagove (npr. "data:SENSOR-1", "sensors") i generacije
+    tih tagova iz trenutka prije čitanja baze. Upis povećava generacije
+    pogođenih tagova u datoteci zajedničkoj svim workerima, pa se unos
+    koji je drugi worker poništio prepoznaje pri sljedećem get(). Isto
+    vrijedi za čitanje kojem je upis došao između upita i put() - takvo
+    tijelo se ne sprema. Veličina je ograničena brojem unosa i ukupnom
+    veličinom tijela, a ttl je gornja granica starosti unosa. max_entries
+    0 isključuje cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 5.0,
+        generations: Optional[TagGenerations] = None,
+        counters: Optional[WorkerCounters] = None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generations = generations or TagGenerations()
+        self.counters = counters or WorkerCounters(COUNTER_NAMES)
+        self._bytes = 0
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._by_tag: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.generation != self.generations.get(entry.tags):
+                    # Poništen upisom (u ovom ili drugom workeru)
+                    self._remove(key)
+                    self._publish_size()
+                    self.counters.incr("invalidations")
+                    entry = None
+                elif entry.expires < time.monotonic():
+                    self._remove(key)
+                    self._publish_size()
+                    entry = None
+            if entry is None:
+                self.counters.incr("misses")
+                return None
+            self._entries.move_to_end(key)
+            self.counters.incr("hits")
+            return entry
+
+    def generation(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        """Trenutne generacije tagova; uzima se prije čitanja iz baze"""
+        return self.generations.get(tags)
+
+    def put(self, key: Hashable, body: bytes, media_type: str, tags: Tuple[str, ...], generation: Tuple[int, ...]):
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+        entry = CachedBody(body, media_type, tags, generation, time.monotonic() + self.ttl)
+        with self._lock:
+            if generation != self.generations.get(tags):
+                # Upis je došao između čitanja i spremanja
+                self.counters.incr("stale_puts")
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.counters.incr("evictions")
+            self._publish_size()
+
+    def invalidate(self, *tags: str):
+        """Poništi unose označene nekim od tagova, u svim workerima"""
+        self.generations.bump(tags)
+        with self._lock:
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                    self.counters.incr("invalidations")
+            self._publish_size()
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def _publish_size(self):
+        self.counters.set("entries", len(self._entries))
+        self.counters.set("bytes", self._bytes)
+
+    def get_stats(self) -> Dict:
+        """Brojači zbrojeni preko svih workera"""
+        totals = self.counters.totals()
+        lookups = totals["hits"] + totals["misses"]
+        return {
+            "enabled": self.enabled,
+            **totals,
+            "hit_ratio": round(totals["hits"] / lookups, 4) if lookups else None,
+            "ttl_seconds": self.ttl,
+            "workers": self.counters.per_worker(),
+        }
@@ -1,27 +1,29 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
+from shared.readings import SensorReading
 
 
 class SensorCreate(BaseModel):
     id: str
     name: str
     location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class SensorResponse(BaseModel):
     id: str 
     name: str
     location: Optional[str]
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
-class SensorDataCreate(BaseModel):
-    sensor_id: str
-    temperature: float
-    aqi: float
-    timestamp : Optional[datetime] = None
+class SensorDataCreate(SensorReading):
+    """Ista shema kao na collectoru; timestamp je Unix epoch (UTC)"""
 
 
 class SensorDataResponse(BaseModel):
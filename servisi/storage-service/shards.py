@@ -0,0 +1,286 @@
+import os
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import create_engine, delete, event, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import SensorData
+from shared import tracing
+
+# Red očitanja kroz shardove: (id, sensor_id, temperature, aqi, timestamp)
+DataRow = Tuple[int, str, float, float, datetime]
+
+DAY_FORMAT = "%Y%m%d"
+EPOCH_DAY = date(1970, 1, 1)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _sqlite_engine(path: str) -> Engine:
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+    if tracing.TRACING:
+        tracing.instrument_sqlalchemy(engine)
+    try:
+        SensorData.__table__.create(bind=engine, checkfirst=True)
+    except OperationalError:
+        # Drugi worker je istodobno kreirao isti shard
+        SensorData.__table__.create(bind=engine, checkfirst=True)
+    return engine
+
+
+class ArchivedShardError(ValueError):
+    """Upis u dan čiji je shard već arhiviran"""
+
+
+class Shard:
+    """Jedna SQLite datoteka s tablicom sensor_data i vlastitim writer lockom"""
+
+    __slots__ = ("name", "path", "index", "engine", "write_lock", "archived")
+
+    def __init__(self, name: str, path: str, index: int):
+        self.name = name
+        self.path = path
+        self.index = index
+        self.engine = _sqlite_engine(path)
+        self.write_lock = threading.Lock()
+        self.archived = False
+
+
+class ShardRouter:
+    """Particioniranje očitanja u više SQLite datoteka.
+
+    mode "day"    - shard po UTC danu očitanja (data-YYYYMMDD.db); stari
+                    dani arhiviraju se premještanjem datoteke
+    mode "sensor" - count shardova po crc32(sensor_id)
+
+    Tablica senzora ostaje u glavnoj bazi. Svaki shard ima svoj writer
+    lock, pa se upisi u različite shardove ne čekaju. Id očitanja je
+    globalan: lokalni id kombiniran s indeksom sharda.
+
+    Arhivirani dan se ne otvara ponovno: novi shard bi krenuo od lokalnog
+    id-a 1 (isti globalni id-evi) i idućim arhiviranjem prepisao arhivu,
+    pa se kasni upisi za takav dan odbijaju s ArchivedShardError.
+    """
+
+    def __init__(self, mode: str, directory: str, count: int = 4):
+        if mode not in ("day", "sensor"):
+            raise ValueError(f"Nepoznat SHARD_MODE: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.count = count
+        self.archive_directory = os.path.join(directory, "archive")
+        self._shards: Dict[str, Shard] = {}
+        self._archived: Set[str] = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        if mode == "sensor":
+            for index in range(count):
+                self._open(f"s{index:02d}of{count:02d}", index)
+        else:
+            if os.path.isdir(self.archive_directory):
+                self._archived = {
+                    filename[5:-3] for filename in os.listdir(self.archive_directory)
+                    if filename.startswith("data-") and filename.endswith(".db")
+                }
+            for filename in sorted(os.listdir(directory)):
+                if filename.startswith("data-") and filename.endswith(".db"):
+                    if filename[5:-3] in self._archived:
+                        # Dan je već u arhivi - datoteka se ne čita niti ponovno arhivira
+                        print(f"Preskačem {filename}: dan je već arhiviran")
+                        continue
+                    day = datetime.strptime(filename[5:-3], DAY_FORMAT).date()
+                    self._open(day.strftime(DAY_FORMAT), (day - EPOCH_DAY).days)
+
+    def _open(self, name: str, index: int) -> Shard:
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is None:
+                if name in self._archived:
+                    raise ArchivedShardError(f"Shard {name} je arhiviran")
+                path = os.path.join(self.directory, f"data-{name}.db")
+                shard = self._shards[name] = Shard(name, path, index)
+            return shard
+
+    def _day_shard(self, day: date) -> Shard:
+        name = day.strftime(DAY_FORMAT)
+        shard = self._shards.get(name)
+        if shard is not None:
+            return shard
+        if name in self._archived:
+            raise ArchivedShardError(f"Shard za {day.isoformat()} je arhiviran")
+        return self._open(name, (day - EPOCH_DAY).days)
+
+    def _sensor_shard(self, sensor_id: str) -> Shard:
+        index = zlib.crc32(sensor_id.encode()) % self.count
+        return self._shards[f"s{index:02d}of{self.count:02d}"]
+
+    def shard_for_write(self, sensor_id: str, timestamp: datetime) -> Shard:
+        if self.mode == "day":
+            return self._day_shard(timestamp.date())
+        return self._sensor_shard(sensor_id)
+
+    def shards_for_read(self, sensor_id: Optional[str] = None) -> List[Shard]:
+        """Shardovi koje upit dotiče; dani od najnovijeg"""
+        if self.mode == "sensor":
+            return [self._sensor_shard(sensor_id)] if sensor_id else list(self._shards.values())
+        return sorted(self._shards.values(), key=lambda shard: shard.name, reverse=True)
+
+    def global_id(self, shard: Shard, local_id: int) -> int:
+        if self.mode == "day":
+            return (shard.index << 32) | local_id
+        return local_id * self.count + shard.index
+
+    def insert(self, sensor_id: str, temperature: float, aqi: float, timestamp: datetime) -> Tuple[DataRow, bool]:
+        """Upiši očitanje u njegov shard; vraća (red, je_li_duplikat).
+
+        ArchivedShardError ako je dan očitanja već arhiviran.
+        """
+        shard = self.shard_for_write(sensor_id, timestamp)
+        table = SensorData.__table__
+        try:
+            with shard.write_lock:
+                if shard.archived:
+                    # Arhiviran između odabira sharda i upisa
+                    raise ArchivedShardError(f"Shard {shard.name} je arhiviran")
+                with shard.engine.begin() as conn:
+                    result = conn.execute(insert(table).values(
+                        sensor_id=sensor_id, temperature=temperature, aqi=aqi, timestamp=timestamp
+                    ))
+                    local_id = result.inserted_primary_key[0]
+            return (self.global_id(shard, local_id), sensor_id, temperature, aqi, timestamp), False
+        except IntegrityError:
+            # Isto (sensor_id, timestamp) već postoji - shard je određen istim ključem
+            with shard.engine.connect() as conn:
+                row = conn.execute(
+                    select(table.c.id, table.c.sensor_id, table.c.temperature, table.c.aqi, table.c.timestamp)
+                    .where(table.c.sensor_id == sensor_id, table.c.timestamp == timestamp)
+                ).first()
+            if row is None:
+                raise
+            return (self.global_id(shard, row[0]), *row[1:]), True
+
+    def query(self, sensor_id: Optional[str], skip: int, limit: int) -> List[DataRow]:
+        """Najnovija očitanja (timestamp desc) preko shardova koje upit dotiče"""
+        table = SensorData.__table__
+        wanted = skip + limit
+        statement = select(table.c.id, table.c.sensor_id, table.c.temperature, table.c.aqi, table.c.timestamp)
+        if sensor_id:
+            statement = statement.where(table.c.sensor_id == sensor_id)
+        statement = statement.order_by(table.c.timestamp.desc()).limit(wanted)
+
+        rows: List[DataRow] = []
+        for shard in self.shards_for_read(sensor_id):
+            if shard.archived:
+                continue
+            with shard.engine.connect() as conn:
+                rows.extend(
+                    (self.global_id(shard, row[0]), *row[1:])
+                    for row in conn.execute(statement)
+                )
+            # Dnevni shardovi ne preklapaju se u vremenu - noviji dani su već pročitani
+            if self.mode == "day" and len(rows) >= wanted:
+                break
+
+        if self.mode == "sensor" and len(self._shards) > 1 and not sensor_id:
+            rows.sort(key=lambda row: row[4], reverse=True)
+        return rows[skip:wanted]
+
+    def migrate_from(self, engine: Engine, batch_size: int = 10000) -> Tuple[int, int]:
+        """Premjesti očitanja iz tablice sensor_data glavne baze u shardove.
+
+        Nakon uključivanja SHARD_MODE čitanja i upisi idu samo u shardove,
+        pa se stari redovi prebacuju pri startu, u serijama po id-u. Upis u
+        shard je INSERT OR IGNORE po (sensor_id, timestamp), a red se iz
+        glavne baze briše tek nakon upisa, pa je prekinuta migracija sigurna
+        za ponavljanje. Redovi za arhivirane dane ostaju u glavnoj bazi.
+        Vraća (premješteno, ostavljeno).
+        """
+        table = SensorData.__table__
+        moved = kept = 0
+        last_id = 0
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(table.c.id, table.c.sensor_id, table.c.temperature, table.c.aqi, table.c.timestamp)
+                    .where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+                ).all()
+            if not rows:
+                return moved, kept
+            last_id = rows[-1][0]
+
+            by_shard: Dict[str, Tuple[Shard, List[Dict]]] = {}
+            moved_ids = []
+            for row_id, sensor_id, temperature, aqi, timestamp in rows:
+                try:
+                    shard = self.shard_for_write(sensor_id, timestamp or EPOCH)
+                except ArchivedShardError:
+                    kept += 1
+                    continue
+                by_shard.setdefault(shard.name, (shard, []))[1].append({
+                    "sensor_id": sensor_id, "temperature": temperature, "aqi": aqi, "timestamp": timestamp
+                })
+                moved_ids.append(row_id)
+
+            for shard, values in by_shard.values():
+                with shard.write_lock, shard.engine.begin() as conn:
+                    conn.execute(insert(table).prefix_with("OR IGNORE"), values)
+            if moved_ids:
+                with engine.begin() as conn:
+                    conn.execute(delete(table).where(table.c.id.in_(moved_ids)))
+            moved += len(moved_ids)
+
+    def archive(self, before: date) -> List[str]:
+        """Arhiviraj dnevne shardove starije od before premještanjem datoteka.
+
+        Postojeće datoteke u arhivi se ne prepisuju - tada se ne arhivira ništa.
+        """
+        if self.mode != "day":
+            raise ValueError("Arhiviranje je podržano samo za SHARD_MODE=day")
+        os.makedirs(self.archive_directory, exist_ok=True)
+        limit = before.strftime(DAY_FORMAT)
+        with self._lock:
+            names = sorted(name for name in self._shards if name < limit)
+            for name in names:
+                target = os.path.join(self.archive_directory, os.path.basename(self._shards[name].path))
+                if any(os.path.exists(target + suffix) for suffix in ("", "-wal", "-shm")):
+                    raise FileExistsError(f"Arhiva već sadrži {os.path.basename(target)}")
+            for name in names:
+                shard = self._shards.pop(name)
+                with shard.write_lock:
+                    shard.archived = True
+                    shard.engine.dispose()
+                    for suffix in ("", "-wal", "-shm"):
+                        if os.path.exists(shard.path + suffix):
+                            os.replace(shard.path + suffix,
+                                       os.path.join(self.archive_directory, os.path.basename(shard.path) + suffix))
+                self._archived.add(name)
+        return names
+
+    def archive_older_than(self, days: int) -> List[str]:
+        return self.archive(datetime.utcnow().date() - timedelta(days=days))
+
+    def get_stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "directory": self.directory,
+            "shards": [
+                {"name": shard.name, "size_bytes": sum(
+                    os.path.getsize(shard.path + suffix)
+                    for suffix in ("", "-wal") if os.path.exists(shard.path + suffix)
+                )}
+                for shard in self.shards_for_read()
+            ]
+        }
@@ -0,0 +1,185 @@
+"""Stanje zajedničko uvicorn workerima storagea, u mmap datoteci uz bazu.
+
+Workeri su zasebni procesi, pa brojači i invalidacija cachea u memoriji
+procesa vrijede samo za jedan worker. Ovdje svaki worker piše u svoj slot
+dijeljene datoteke, a čitanje zbraja slotove živih workera; generacije
+tagova cachea dijele svi workeri.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+
+WORKER_STATE_DIR = os.getenv("WORKER_STATE_DIR")
+
+_U64 = struct.Struct("<Q")
+
+
+def state_path(engine: Engine, name: str) -> Optional[str]:
+    """Datoteka stanja: u WORKER_STATE_DIR ili uz SQLite bazu; None - samo ovaj proces"""
+    if WORKER_STATE_DIR:
+        os.makedirs(WORKER_STATE_DIR, exist_ok=True)
+        return os.path.join(WORKER_STATE_DIR, f"storage-{name}")
+    database = engine.url.database
+    if engine.url.get_backend_name() == "sqlite" and database and database != ":memory:":
+        return f"{database}-{name}"
+    return None
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMap:
+    """mmap datoteka fiksne veličine s lockom preko procesa i threadova"""
+
+    def __init__(self, path: Optional[str], size: int):
+        self._lock = threading.Lock()
+        if path is None:
+            self._fd = None
+            self.map = mmap.mmap(-1, size)
+            return
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self.locked():
+            if os.fstat(self._fd).st_size != size:
+                # Nova datoteka ili drugačiji raspored (nova verzija) - kreni od nule
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+        self.map = mmap.mmap(self._fd, size)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        # flock isključuje druge procese, threading.Lock threadove ovog procesa
+        with self._lock:
+            if self._fd is None:
+                yield
+                return
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def read(self, offset: int) -> int:
+        return _U64.unpack_from(self.map, offset)[0]
+
+    def write(self, offset: int, value: int):
+        _U64.pack_into(self.map, offset, value)
+
+    def add(self, offset: int, amount: int):
+        """Uvećaj vrijednost; slot piše samo ovaj proces, pa je dovoljan lock threadova"""
+        with self._lock:
+            self.write(offset, self.read(offset) + amount)
+
+
+class WorkerCounters:
+    """Imenovani brojači po workeru; totals() zbraja sve žive workere.
+
+    Slot (pid + brojači) worker zauzima pri prvom upisu; slot mrtvog
+    procesa preuzima se i nulira, pa brojači vrijede od starta trenutnih
+    workera, kao i prije u memoriji procesa.
+    """
+
+    def __init__(self, names: Iterable[str], path: Optional[str] = None, max_workers: int = 64):
+        self.names: Tuple[str, ...] = tuple(names)
+        self._index = {name: index for index, name in enumerate(self.names)}
+        self._slot_size = (1 + len(self.names)) * _U64.size
+        self._max_workers = max_workers
+        self._shared = SharedMap(path, self._slot_size * max_workers)
+        self._pid: Optional[int] = None
+        self._offset = 0
+
+    def _slot(self) -> int:
+        pid = os.getpid()
+        if self._pid != pid:
+            self._claim(pid)
+        return self._offset
+
+    def _claim(self, pid: int):
+        shared = self._shared
+        with shared.locked():
+            free = None
+            for slot in range(self._max_workers):
+                offset = slot * self._slot_size
+                owner = shared.read(offset)
+                if owner == pid:
+                    free = offset
+                    break
+                if free is None and (owner == 0 or not _is_alive(owner)):
+                    free = offset
+            if free is None:
+                # Svi slotovi zauzeti - brojači ovog procesa ostaju samo lokalni
+                print(f"Nema slobodnog slota za brojače workera (pid {pid})")
+                self._shared = shared = SharedMap(None, self._slot_size)
+                free = 0
+            elif shared.read(free) != pid:
+                shared.map[free:free + self._slot_size] = bytes(self._slot_size)
+                shared.write(free, pid)
+        self._pid = pid
+        self._offset = free
+
+    def incr(self, name: str, amount: int = 1):
+        self._shared.add(self._slot() + (1 + self._index[name]) * _U64.size, amount)
+
+    def set(self, name: str, value: int):
+        offset = self._slot() + (1 + self._index[name]) * _U64.size
+        self._shared.write(offset, value)
+
+    def per_worker(self) -> List[Dict]:
+        """Brojači svakog živog workera, s pid-om"""
+        shared = self._shared
+        result = []
+        for slot in range(len(shared.map) // self._slot_size):
+            offset = slot * self._slot_size
+            pid = shared.read(offset)
+            if pid == 0 or not _is_alive(pid):
+                continue
+            counts = {name: shared.read(offset + (1 + index) * _U64.size) for index, name in enumerate(self.names)}
+            result.append({"pid": pid, **counts})
+        return result
+
+    def totals(self) -> Dict[str, int]:
+        totals = dict.fromkeys(self.names, 0)
+        for worker in self.per_worker():
+            for name in self.names:
+                totals[name] += worker[name]
+        return totals
+
+
+class TagGenerations:
+    """Generacije tagova cachea zajedničke svim workerima.
+
+    Tag se hashira u jedan od slots brojača; kolizija samo uzrokuje
+    suvišnu invalidaciju. Vrijednosti se uspoređuju samo na jednakost,
+    pa stara datoteka od prijašnjeg pokretanja ne smeta.
+    """
+
+    def __init__(self, path: Optional[str] = None, slots: int = 65536):
+        self.slots = slots
+        self._shared = SharedMap(path, slots * _U64.size)
+
+    def _offset(self, tag: str) -> int:
+        return (zlib.crc32(tag.encode()) % self.slots) * _U64.size
+
+    def get(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        shared = self._shared
+        return tuple(shared.read(self._offset(tag)) for tag in tags)
+
+    def bump(self, tags: Iterable[str]):
+        shared = self._shared
+        with shared.locked():
+            for tag in tags:
+                offset = self._offset(tag)
+                shared.write(offset, shared.read(offset) + 1)